@@ -0,0 +1,311 @@
+"""
+Benchmarks for the hot paths of the library, not collected by pytest
+usage: python bench.py [name ...]
+"""
+from os.path import getsize
+from timeit import timeit
+from os import remove
+from sys import argv
+import tracemalloc
+
+import numpy as np
+
+from prev_gen import Color, ColorArray
+
+
+def bench_colors(n: int = 1_000_000):
+    """
+    Memory and attribute access of n colors
+    """
+    values = np.random.default_rng(0).random((n, 3))
+    # one by one is too slow for the full count, a sample shows the per-color cost
+    sample = [tuple(i) for i in values[:n // 100].tolist()]
+    tracemalloc.start()
+    colors = [Color(i) for i in sample]
+    for i in colors:
+        _ = i.srgb, i.oklab
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'colors:      one by one, {mem / len(colors):.0f} B each')
+    del colors
+    tracemalloc.start()
+    colors = ColorArray(values).to_colors('srgb', 'oklab')
+    mem = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f'colors:      {n} from a ColorArray, {mem / n:.0f} B each')
+    c = colors[n // 2]
+    for attr in ('alpha', 'name', 'rgb', 'srgb', 'dark'):
+        t = timeit(f'c.{attr}', globals={'c': c}, number=n)
+        print(f'colors:      c.{attr:<6} {t / n * 1e9:.0f} ns')
+
+
+def bench_kernels(n: int = 10_000):
+    """
+    Bar and text colors of n tiles, through the conversion graph and through the kernels
+    """
+    from prev_gen.previewer import palette_colors
+    from prev_gen.conversion import convert
+    colors = ColorArray(np.random.default_rng(0).random((n, 3))).to_colors()
+
+    def graph(c: Color):
+        lab = convert(c.rgb, 'rgb', 'oklab')
+        bar = convert((lab[0] * 0.9, lab[1], lab[2]), 'oklab', 'srgb')
+        text = convert((lab[0] * 0.9 + 0.3 if c.dark else lab[0] * 0.75 - 0.15, lab[1], lab[2]), 'oklab', 'srgb')
+        return bar, text
+
+    # the graph is too slow for the full count, a sample shows the per-tile cost
+    t = timeit(lambda: [graph(c) for c in colors[:n // 10]], number=1)
+    print(f'kernels:     per tile, {t / (n // 10) * 1e6:.1f} us each')
+    t = timeit(lambda: palette_colors(colors), number=1)
+    print(f'kernels:     {n} as a palette, {t / n * 1e6:.1f} us each')
+
+
+def bench_png(n: int = 2_000):
+    """
+    Rendering a PNG preview of n named tiles
+    """
+    from prev_gen import Previewer
+    values = np.random.default_rng(0).random((n, 3))
+    colors = ColorArray(values, name=['name'] * n, desc_left=['left'] * n, desc_right=['right'] * n).to_colors()
+    t = timeit(lambda: Previewer(colors, show=False), number=1)
+    print(f'png:         {n} tiles, {t:.2f} s')
+
+
+def bench_text(n: int = 2_000):
+    """
+    Drawing the texts of a PNG preview of n tiles with repeated names and descriptions, with no text rasterized yet
+    and with every text rasterized by an earlier render
+    """
+    from prev_gen.previewer import PNGPreviewer, _sprite, palette_colors
+    from prev_gen import Palette
+    from PIL import Image
+    values = np.random.default_rng(0).random((n, 3))
+    names = [('light', 'dark', 'accent')[i % 3] for i in range(n)]
+    colors = ColorArray(values, name=names, desc_left=['light'] * n, desc_right=['dark'] * n).to_colors()
+    p = Palette([colors[i:i + 40] for i in range(0, n, 40)])
+    bar, text = palette_colors(p.colors)
+    text = text.tolist()
+    layer = PNGPreviewer._draw_layer(p, bar)
+    img = Image.fromarray(layer).resize(tuple[int, int](p.size), Image.Resampling.NEAREST)
+    for name in ('cold', 'warm'):
+        if name == 'cold':
+            _sprite.cache_clear()
+        t = timeit(lambda: PNGPreviewer._draw_texts(img.copy(), layer, p, text, range(len(p.colors))), number=1)
+        print(f'text:        {n} tiles, {name} {t:.2f} s')
+
+
+def bench_layer(n: int = 100_000):
+    """
+    Rasterizing the backgrounds and bars of n small tiles
+    """
+    from prev_gen.previewer import PNGPreviewer, palette_colors
+    from prev_gen import Palette, Settings
+    from PIL import Image
+    colors = ColorArray(np.random.default_rng(0).random((n, 3))).to_colors()
+    p = Palette([Settings(grid_width=8, grid_height=6, bar_height=1), *colors])
+    bar = palette_colors(p.colors)[0]
+    t = timeit(lambda: Image.fromarray(PNGPreviewer._draw_layer(p, bar)).resize(p.size, Image.NEAREST), number=1)
+    print(f'layer:       {n} tiles, {t:.2f} s')
+
+
+def bench_palette(n: int = 100_000):
+    """
+    Creating a palette of n colors and iterating over its tiles
+    """
+    from prev_gen import Palette
+    colors = ColorArray(np.random.default_rng(0).random((n, 3))).to_colors()
+    t = timeit(lambda: Palette(colors), number=1)
+    p = Palette(colors)
+    ti = timeit(lambda: sum(1 for _ in p), number=1)
+    # the way the previewers go over it, without creating tiles
+    tl = timeit(lambda: sum(1 for _ in zip(p.layout.tolist(), p.colors)), number=1)
+    print(f'palette:     {n} colors, create {t:.2f} s, iterate tiles {ti:.2f} s, iterate layout {tl:.3f} s')
+
+
+def bench_config(n: int = 100_000):
+    """
+    Creating a palette and a config out of n colors in rows of uneven length
+    """
+    from prev_gen import Config, Palette
+    colors = ColorArray.from_hex([f'#{i:06x}' for i in np.random.default_rng(0).integers(0, 1 << 24, n)]).to_colors()
+    rows = [colors[i:i + 99] for i in range(0, n, 100)]
+    tp = timeit(lambda: Palette(rows), number=1)
+    tc = timeit(lambda: Config(rows, output='json'), number=1)
+    print(f'config:      {n} colors, palette {tp:.2f} s, json config {tc:.2f} s')
+
+
+def bench_reverse_png(n: int = 20_000):
+    """
+    Reversing a saved PNG preview of n small named tiles, with the file size
+    """
+    from prev_gen import Previewer, Reverser, Settings
+    colors = ColorArray(np.random.default_rng(0).random((n, 3)), name=[f'name {i}' for i in range(n)]).to_colors()
+    s = Settings(
+        file_name='benchReversePNG', grid_width=24, grid_height=16, bar_height=3, hex_size_nameless=1, name_size=1
+    )
+    Previewer([s, *colors], show=False, save=True)
+    t = timeit(lambda: Reverser('benchReversePNG.png'), number=1)
+    size = getsize('benchReversePNG.png')
+    remove('benchReversePNG.png')
+    print(f'reverse_png: {n} tiles, {t:.2f} s, {size / 2 ** 10:.0f} KiB')
+
+
+def bench_reverse_svg(n: int = 20_000):
+    """
+    Reversing a saved SVG preview of n named tiles, with the peak memory of the parse
+    """
+    from prev_gen import Previewer, Reverser, Settings
+    colors = ColorArray(np.random.default_rng(0).random((n, 3)), name=['name'] * n).to_colors()
+    Previewer([Settings(file_name='benchReverseSVG'), *colors], show=False, save=True, output='svg')
+    t = timeit(lambda: Reverser('benchReverseSVG.svg'), number=1)
+    tracemalloc.start()
+    Reverser('benchReverseSVG.svg')
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    remove('benchReverseSVG.svg')
+    print(f'reverse_svg: {n} tiles, {t:.2f} s, {peak / 2 ** 20:.0f} MiB peak')
+
+
+def bench_settings(n: int = 100_000):
+    """
+    Encoding and decoding the settings metadata, against the pickle format of older versions
+    """
+    from base64 import b64decode, b64encode
+    from pickle import dumps, loads
+    from prev_gen import Settings
+    s = Settings(file_name='palette', font_name='Roboto', font_opts={'wght': 400}, grid_width=200, show_hash=True)
+    legacy = str(b64encode(dumps(s.to_dict())), 'latin1')
+    current = s.serialize()
+    for name, encode, decode, data in (
+        ('pickle', lambda: b64encode(dumps(s.to_dict())), lambda: Settings(**loads(b64decode(legacy))), legacy),
+        ('json', s.serialize, lambda: Settings.deserialize(current), current)
+    ):
+        te = timeit(encode, number=n) / n
+        td = timeit(decode, number=n) / n
+        print(f'settings:    {name}, {len(data)} B, encode {te * 1e6:.1f} us, decode {td * 1e6:.1f} us')
+
+
+def bench_session(n: int = 2_000):
+    """
+    Updating one tile of a preview session, against drawing the whole preview
+    """
+    from prev_gen import Previewer, PreviewSession
+    rng = np.random.default_rng(0)
+    rows = [[Color(tuple(i), 'name', 'left', 'right') for i in rng.random((40, 3)).tolist()] for _ in range(n // 40)]
+    for output in ('png', 'svg'):
+        session = PreviewSession(output)
+        session.update(rows)
+        full = timeit(lambda: Previewer(rows, show=False, output=output), number=1)
+
+        def change():
+            rows[rng.integers(len(rows))][rng.integers(40)] = Color(tuple(rng.random(3)), 'changed')
+            session.update(rows)
+        t = timeit(change, number=10) / 10
+        print(f'session:     {output}, {n} tiles, one changed {t * 1e3:.0f} ms, all drawn {full * 1e3:.0f} ms')
+
+
+def bench_workers(n: int = 2_000):
+    """
+    Rendering a PNG preview of n named tiles in bands, one process per core
+    """
+    from os import cpu_count
+    from prev_gen import Previewer
+    values = np.random.default_rng(0).random((n, 3))
+    colors = ColorArray(values, name=['name'] * n, desc_left=['left'] * n, desc_right=['right'] * n).to_colors()
+    rows = [colors[i:i + 40] for i in range(0, n, 40)]
+    for workers in sorted({1, 2, cpu_count() or 1}):
+        t = timeit(lambda: Previewer(rows, show=False, workers=workers), number=1)
+        print(f'workers:     {n} tiles, {workers} of {cpu_count()} cores, {t:.2f} s')
+
+
+def bench_cache(n: int = 2_000):
+    """
+    Rendering n named tiles from a fresh palette, against from the memory and disk tiers of the render cache
+    """
+    from tempfile import TemporaryDirectory
+    from prev_gen import RenderCache, render_bytes
+    rng = np.random.default_rng(0)
+    rows = [[Color(tuple(i), 'name', 'left', 'right') for i in rng.random((40, 3)).tolist()] for _ in range(n // 40)]
+    with TemporaryDirectory() as d:
+        for output in ('png', 'svg'):
+            cache = RenderCache(directory=d)
+            miss = timeit(lambda: render_bytes(rows, output, cache=cache), number=1)
+            memory = timeit(lambda: render_bytes(rows, output, cache=cache), number=10) / 10
+            disk = timeit(lambda: render_bytes(rows, output, cache=RenderCache(directory=d)), number=10) / 10
+            print(f'cache:       {output}, {n} tiles, {miss * 1e3:.0f} ms rendered, '
+                  f'{memory * 1e3:.1f} ms from memory, {disk * 1e3:.1f} ms from disk')
+
+
+def bench_stream(n: int = 10_000):
+    """
+    Writing a PNG preview of n named tiles a row of tiles at a time, against drawing the whole image and saving it
+    The peak memory of the process is taken after each, so the streamed one is run first
+    """
+    from resource import RUSAGE_SELF, getrusage
+    from prev_gen import render_bytes, render_stream
+    values = np.random.default_rng(0).random((n, 3))
+    colors = ColorArray(values, name=['name'] * n, desc_left=['left'] * n, desc_right=['right'] * n).to_colors()
+    rows = [colors[i:i + 40] for i in range(0, n, 40)]
+    for name, f in (('streamed', lambda: b''.join(render_stream(rows))), ('drawn whole', lambda: render_bytes(rows))):
+        sizes = []
+        t = timeit(lambda: sizes.append(len(f())), number=1)
+        peak = getrusage(RUSAGE_SELF).ru_maxrss >> 10
+        print(f'stream:      {n} tiles, {name} {t:.2f} s, {sizes[0] >> 10} KiB, peak memory {peak} MiB')
+
+
+def bench_svg(n: int = 10_000):
+    """
+    Writing an SVG preview of n named tiles as it is streamed, and with the tree Previewer returns
+    """
+    from prev_gen import Previewer, render_stream
+    values = np.random.default_rng(0).random((n, 3))
+    colors = ColorArray(values, name=['name'] * n, desc_left=['left'] * n, desc_right=['right'] * n).to_colors()
+    rows = [colors[i:i + 40] for i in range(0, n, 40)]
+    # the font is subset once for the characters of the palette, then cached
+    sizes = [sum(len(i) for i in render_stream(rows, 'svg'))]
+    t = timeit(lambda: sum(len(i) for i in render_stream(rows, 'svg')), number=1)
+    tree = timeit(lambda: Previewer(rows, show=False, output='svg'), number=1)
+    print(f'svg:         {n} tiles, streamed {t:.2f} s, {sizes[0] >> 10} KiB, as a tree {tree:.2f} s')
+
+
+def bench_svg_size(n: int = 2_000):
+    """
+    The size of an SVG preview of n named tiles from a palette of a few hundred colors, plain and compact, and as svgz
+    """
+    from prev_gen import Settings, render_bytes
+    values = np.random.default_rng(0).random((300, 3))[np.random.default_rng(1).integers(300, size=n)]
+    colors = ColorArray(values, name=['name'] * n, desc_left=['left'] * n).to_colors()
+    rows = [colors[i:i + 40] for i in range(0, n, 40)]
+    for compact in (False, True):
+        palette = [Settings(compact=compact), *rows]
+        for output in ('svg', 'svgz'):
+            # the first render also subsets the font
+            size = len(render_bytes(palette, output))
+            t = timeit(lambda: render_bytes(palette, output), number=1)
+            print(f'svg size:    {n} tiles, {"compact" if compact else "plain"} {output} {size >> 10} KiB, {t:.2f} s')
+
+
+def bench_profiles(n: int = 2_000, k: int = 64):
+    """
+    Encoding a PNG preview of n named tiles from a palette of k colors with each profile, as png and lossless webp
+    The image is drawn once, only the encoding is timed
+    """
+    from prev_gen import Palette, Settings
+    from prev_gen.previewer import PNGPreviewer
+    from io import BytesIO
+    values = np.random.default_rng(0).random((k, 3))[np.random.default_rng(1).integers(k, size=n)]
+    colors = ColorArray(values, name=['name'] * n, desc_left=['left'] * n).to_colors()
+    rows = [colors[i:i + 40] for i in range(0, n, 40)]
+    img, _, _, _ = PNGPreviewer._render(Palette(rows))
+    for output in ('png', 'webp'):
+        for profile in ('fast', 'default', 'small'):
+            s = Settings(profile=profile)
+            with BytesIO() as f:
+                t = timeit(lambda: PNGPreviewer._save(img, f, s, output), number=1)
+                size = f.tell()
+            print(f'profiles:    {n} tiles of {k} colors, {profile} {output} {t:.2f} s, {size >> 10} KiB')
+
+
+if __name__ == '__main__':
+    for name in argv[1:] or [k.removeprefix('bench_') for k in list(globals()) if k.startswith('bench_')]:
+        globals()[f'bench_{name}']()
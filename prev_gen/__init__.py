@@ -1,6 +1,8 @@
-from .previewer import Previewer
+from .previewer import Previewer, PreviewSession, render_bytes, render_many, render_stream
+from .reverser import Reverser, reverse_bytes, reverse_stream
+from .color_array import ColorArray
+from .cache import RenderCache
 from .distance import Distance
-from .reverser import Reverser
 from .settings import Settings
 from .palette import Palette
 from .config import Config
@@ -0,0 +1,179 @@
+from os import environ, getpid, makedirs, remove, replace, scandir, utime
+from os.path import expanduser, join
+from dataclasses import dataclass, field
+from threading import Lock, get_ident
+from collections import OrderedDict
+from sys import platform
+from re import compile
+
+
+def cache_dir(*sub: str) -> str:
+    """
+    The per-user cache directory of this library, created if missing
+    Overridden by the PREV_GEN_CACHE environment variable
+
+    :param sub: Subdirectories to append
+    :return:    The path to the directory
+    """
+    if 'PREV_GEN_CACHE' in environ:
+        base = environ['PREV_GEN_CACHE']
+    elif platform == 'win32':
+        base = join(environ.get('LOCALAPPDATA', expanduser('~')), 'prev_gen', 'cache')
+    elif platform == 'darwin':
+        base = join(expanduser('~/Library/Caches'), 'prev_gen')
+    else:
+        base = join(environ.get('XDG_CACHE_HOME', expanduser('~/.cache')), 'prev_gen')
+    path = join(base, *sub)
+    makedirs(path, exist_ok=True)
+    return path
+
+
+# the names of the files the cache writes, anything else in its directory is never touched
+_entry = compile(r'[0-9a-f]{64}\.(png|svg|svgz|webp|css)')
+
+
+@dataclass(slots=True)
+class RenderCache:
+    """
+    Rendered files by the hash of everything they were rendered from, in memory and on disk
+    Each tier drops its least recently used files once it holds more than its size
+
+    Attributes:
+        memory_size: Bytes kept in memory
+
+        disk_size:   Bytes kept on disk, 0 to keep nothing there
+
+        directory:   Where the files are kept on disk, the renders cache directory if not set
+
+        hits:        Files found in either tier
+
+        misses:      Files that had to be rendered
+    """
+    memory_size: int = 64 << 20
+    disk_size: int = 256 << 20
+    directory: str | None = None
+    hits: int = field(default=0, init=False)
+    misses: int = field(default=0, init=False)
+    _memory: OrderedDict[str, bytes] = field(default_factory=OrderedDict, init=False, repr=False)
+    _used: int = field(default=0, init=False, repr=False)
+    _disk: int | None = field(default=None, init=False, repr=False)
+    _lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    def _dir(self) -> str:
+        return self.directory or cache_dir('renders')
+
+    def _file(self, key: str, ext: str) -> str:
+        return join(self._dir(), f'{key}.{ext}')
+
+    def get(self, key: str, ext: str) -> bytes | None:
+        """
+        :param key: The hash of what the file is rendered from
+        :param ext: The file extension
+        :return:    The file contents, or None if neither tier has it
+        """
+        with self._lock:
+            if (data := self._memory.get(key)) is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return data
+        data = None
+        if self.disk_size:
+            try:
+                with open(fn := self._file(key, ext), 'rb') as f:
+                    data = f.read()
+                # the modification time orders the files for eviction
+                utime(fn)
+            except OSError:
+                pass
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key: str, ext: str, data: bytes):
+        """
+        :param key:  The hash of what the file is rendered from
+        :param ext:  The file extension
+        :param data: The file contents
+        """
+        self._remember(key, data)
+        if not self.disk_size or len(data) > self.disk_size:
+            return
+        try:
+            fn = self._file(key, ext)
+            # write next to the target and swap, so concurrent processes and threads never read a partial file
+            tmp = f'{fn}.{getpid()}.{get_ident()}'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            replace(tmp, fn)
+        except OSError:
+            return
+        with self._lock:
+            # the directory is only scanned again once the files written since the last scan could fill it
+            # files other processes write are counted at that scan
+            self._disk = None if self._disk is None else self._disk + len(data)
+            full = self._disk is None or self._disk > self.disk_size
+        if full:
+            self._evict(self.disk_size)
+
+    def clear(self):
+        """
+        Empties both tiers
+        """
+        with self._lock:
+            self._memory.clear()
+            self._used = 0
+        self._evict(0)
+
+    def _remember(self, key: str, data: bytes):
+        if len(data) > self.memory_size:
+            return
+        with self._lock:
+            if key not in self._memory:
+                self._memory[key] = data
+                self._used += len(data)
+            self._memory.move_to_end(key)
+            while self._used > self.memory_size:
+                self._used -= len(self._memory.popitem(last=False)[1])
+
+    def _evict(self, limit: int):
+        """
+        :param limit: Bytes to keep on disk, the least recently used files are removed first
+        """
+        files = []
+        try:
+            with scandir(self._dir()) as it:
+                for i in it:
+                    if _entry.fullmatch(i.name) and i.is_file():
+                        st = i.stat()
+                        files.append((st.st_mtime, st.st_size, i.path))
+        except OSError:
+            return
+        files.sort()
+        used = sum(i[1] for i in files)
+        for _, size, path in files:
+            if used <= limit:
+                break
+            try:
+                remove(path)
+                used -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk = used
+
+
+@dataclass(slots=True)
+class FontCache(RenderCache):
+    """
+    The css that embeds fonts into svg previews, kept in the fonts cache directory if directory is not set
+    """
+    def _dir(self) -> str:
+        return self.directory or cache_dir('fonts')
+
+
+# the cache used when rendering with cache=True
+render_cache = RenderCache()
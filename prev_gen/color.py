@@ -1,27 +1,43 @@
 from __future__ import annotations
 
-from base64 import b64decode, b64encode
+from json import JSONDecodeError, dumps, loads
+from dataclasses import dataclass, field
 from collections.abc import Sequence
-from dataclasses import dataclass
 from typing import Any, ClassVar
+from base64 import b64decode
 from math import isclose
 
-# noinspection PyProtectedMember
-from colour.graph.conversion import _build_graph
 from networkx.exception import NodeNotFound
 from multimethod import multidispatch
 from numpy.typing import NDArray
-from colour import convert
-from numpy import ndarray
+from numpy import asarray
 
+from .notation import CSS_COLOR_3, hex_to_srgb, parse_hex
+from .kernels import rgb_to, rgb_to_srgb, srgb_to_rgb_single, to_rgb
+from .conversion import convert, models
 from .types import color_format
 
 
-@dataclass
+_slotted = frozenset(('rgb', 'srgb', 'oklab', 'hexadecimal'))
+
+
+def _pack(value: Any) -> tuple[float, ...] | str:
+    """
+    Stores a converted value in its compact form, a tuple of floats or a string
+    """
+    if isinstance(value, str):
+        return str(value)
+    # already packed, as handed out in bulk by ColorArray
+    if type(value) is tuple and all(type(i) is float for i in value):
+        return value
+    return tuple(asarray(value, dtype=float).ravel().tolist())
+
+
+@dataclass(slots=True)
 class Color:
     """
     Represents one color tile in the image, any descriptions it may have - and facilitates color conversions
-    Attributes are calculated lazily for efficiency
+    Attributes are calculated lazily for efficiency, each model is converted once and cached
 
     Attributes:
         name:       Color name
@@ -52,14 +68,18 @@ class Color:
     :param model:      Specifies type of color created
     :param alpha:      The transparency value to assign
     """
-    _conversions: ClassVar = _build_graph()
+    _conversions: ClassVar = models
     name: str
     desc_left: str
     desc_right: str
     alpha: float
-    dark: bool
     original: str
-    rgb: list[float]
+    # the models read while drawing get their own slots, the rest is cached in a dict created on demand
+    _rgb: tuple[float, ...] = field(repr=False)
+    _srgb: tuple[float, ...] | None = field(repr=False)
+    _oklab: tuple[float, ...] | None = field(repr=False)
+    _hexadecimal: str | None = field(repr=False)
+    _models: dict[str, tuple[float, ...] | str] | None = field(repr=False)
 
     @multidispatch
     def __init__(
@@ -91,8 +111,11 @@ class Color:
     ):
         _ = model
         self.original = color.original
-        setattr(self, color.original, getattr(color, color.original))
-        self.rgb = color.rgb
+        self._rgb = color._rgb
+        self._srgb = color._srgb
+        self._oklab = color._oklab
+        self._hexadecimal = color._hexadecimal
+        self._models = dict(color._models) if color._models else None
         self.name = name or color.name
         self.desc_left = desc_left or color.desc_left
         self.desc_right = desc_right or color.desc_right
@@ -112,32 +135,7 @@ class Color:
         alpha: float | None = None,
     ):
         _ = model
-        color_orig = color
-        try:
-            color = convert(color, 'css color 3', 'hexadecimal')
-            setattr(self, 'css color 3', color)
-            self.original = 'css color 3'
-        except AssertionError:
-            self.original = 'hexadecimal'
-            color = color.removeprefix('#')
-        match len(color):
-            case 3:
-                color = ''.join(x * 2 for x in color)
-            case 4:
-                color = ''.join(x * 2 for x in color[:3])
-                alpha = int(color[3] * 2, 16)
-            case 8:
-                color = color[:6]
-                alpha = int(color[6:8], 16)
-        self.hexadecimal = '#' + color.lower()
-        try:
-            self.rgb = convert(color, 'hexadecimal', 'rgb')
-        except ValueError:
-            raise ValueError(f'The color <{color_orig}> does not have a valid hexadecimal value')
-        self.alpha = max(0., min(alpha if alpha is not None else 1., 1.))
-        self.name = name
-        self.desc_left = desc_left
-        self.desc_right = desc_right
+        self._load_str(color, name, desc_left, desc_right, alpha, css=True)
 
     @__init__.register
     def __init__(
@@ -148,64 +146,236 @@ class Color:
         desc_right: str = '',
         model: color_format = 'srgb',
         alpha: float | None = None
+    ):
+        self._load_array(color, name, desc_left, desc_right, model, alpha)
+
+    def _load_str(self, color: str, name: str, desc_left: str, desc_right: str, alpha: float | None, css: bool):
+        self._clear()
+        if css and (hx := CSS_COLOR_3.get(color.lower())) is not None:
+            self.original = 'css color 3'
+            self._set('css color 3', hx)
+        else:
+            self.original = 'hexadecimal'
+            hx, hex_alpha = parse_hex(color)
+            if hex_alpha is not None:
+                alpha = hex_alpha
+        self._hexadecimal = hx
+        self._srgb = hex_to_srgb(hx)
+        self._rgb = srgb_to_rgb_single(self._srgb)
+        self.alpha = max(0., min(alpha if alpha is not None else 1., 1.))
+        self.name = name
+        self.desc_left = desc_left
+        self.desc_right = desc_right
+
+    def _load_array(
+        self,
+        color: NDArray | Sequence,
+        name: str,
+        desc_left: str,
+        desc_right: str,
+        model: str,
+        alpha: float | None
     ):
         model = model.lower()
         self.original = model
-        setattr(self, model, color)
+        self._clear()
         # catch conversion errors early by doing one conversion greedily
         # also always have RGB set because it converts well
-        if model != 'rgb':
+        if model == 'rgb' or model in to_rgb:
+            if len(color) != 3:
+                raise ValueError(f'The color <{color}> does not have 3 components')
+            if model == 'rgb':
+                self._srgb = _pack(rgb_to_srgb(color))
+            else:
+                self._rgb = _pack(to_rgb[model](color))
+        else:
             try:
-                self.rgb = convert(color, model, 'rgb')
+                self._rgb = _pack(convert(color, model, 'rgb'))
             except NodeNotFound:
                 raise ValueError(f'Target model <{model}> is not available')
-        else:
-            convert(color, model, 'srgb')
+        self._set(model, _pack(color))
         self.alpha = max(0., min(alpha if alpha is not None else 1., 1.))
         self.name = name
         self.desc_left = desc_left
         self.desc_right = desc_right
 
+    @classmethod
+    def from_hex(
+        cls,
+        color: str,
+        name: str = '',
+        desc_left: str = '',
+        desc_right: str = '',
+        alpha: float | None = None
+    ) -> Color:
+        """
+        Creates a Color from a hex string without type dispatch, see Color for the parameters
+        The transparency in 4 and 8 digit strings takes precedence over alpha
+        """
+        self = object.__new__(cls)
+        self._load_str(color, name, desc_left, desc_right, alpha, css=False)
+        return self
+
+    @classmethod
+    def from_css(
+        cls,
+        color: str,
+        name: str = '',
+        desc_left: str = '',
+        desc_right: str = '',
+        alpha: float | None = None
+    ) -> Color:
+        """
+        Creates a Color from a css color name or a hex string without type dispatch, see Color for the parameters
+        """
+        self = object.__new__(cls)
+        self._load_str(color, name, desc_left, desc_right, alpha, css=True)
+        return self
+
+    @classmethod
+    def from_rgb(
+        cls,
+        color: NDArray | Sequence[float],
+        name: str = '',
+        desc_left: str = '',
+        desc_right: str = '',
+        alpha: float | None = None
+    ) -> Color:
+        """
+        Creates a Color from linear RGB values without type dispatch, see Color for the parameters
+        """
+        self = object.__new__(cls)
+        self._load_array(color, name, desc_left, desc_right, 'rgb', alpha)
+        return self
+
+    @classmethod
+    def from_array(
+        cls,
+        color: NDArray | Sequence[float],
+        name: str = '',
+        desc_left: str = '',
+        desc_right: str = '',
+        model: color_format = 'srgb',
+        alpha: float | None = None
+    ) -> Color:
+        """
+        Creates a Color from values in any model without type dispatch, see Color for the parameters
+        """
+        self = object.__new__(cls)
+        self._load_array(color, name, desc_left, desc_right, model, alpha)
+        return self
+
+    @classmethod
+    def from_models(
+        cls,
+        models: dict[str, Any],
+        original: str,
+        name: str = '',
+        desc_left: str = '',
+        desc_right: str = '',
+        alpha: float = 1.
+    ) -> Color:
+        """
+        Creates a Color out of already converted values, without doing any conversions
+        Used by ColorArray to hand out colors converted in bulk
+
+        :param models:     Mapping of model to value, needs to contain rgb and the original model
+        :param original:   The mode this color was created in
+        :param name:       The name to display
+        :param desc_left:  Left corner description
+        :param desc_right: Right corner description
+        :param alpha:      The transparency value to assign
+        :return:           The created Color
+        """
+        self = object.__new__(cls)
+        self._clear()
+        for k, v in models.items():
+            self._set(k, _pack(v))
+        self.original = original
+        self.alpha = max(0., min(alpha, 1.))
+        self.name = name
+        self.desc_left = desc_left
+        self.desc_right = desc_right
+        return self
+
     def __eq__(self, other: Any) -> bool:
         try:
             return all(isclose(x, y, rel_tol=5e-3) for x, y in zip(self.srgb, Color(other).srgb))
         except ValueError:
             return False
 
-    def __getattribute__(self, item: str) -> Any:
+    def __getattr__(self, item: str) -> Any:
         """
-        this is overriden to allow loading attributes lazily
+        Only called for attributes that are not slots or properties, loads the other models lazily
         """
-        try:
-            v = object.__getattribute__(self, item)
-        except AttributeError:
-            match item:
-                case 'dark':
-                    v = self.oklab[0] <= 0.483
-                    self.dark = v
-                case _ if item.lower() == 'rgb':
-                    # this should always be calculated greedily, but might as well make sure it can be inferred
-                    v = convert(getattr(self, self.original), self.original, item)
-                    setattr(self, 'rgb', v)
-                case _ if item.lower() in Color._conversions:
-                    v = convert(self.rgb, 'rgb', item)
-                    setattr(self, item.lower(), v)
-                case x:
-                    raise AttributeError(f'Attribute <{x}> not found and not loaded lazily.')
-        if isinstance(v, ndarray):
-            return v.tolist()
+        model = item.lower()
+        if model not in Color._conversions:
+            raise AttributeError(f'Attribute <{item}> not found and not loaded lazily.')
+        v = self._model(model)
+        return v if isinstance(v, str) else list(v)
+
+    def _clear(self):
+        """
+        Empties the model cache
+        """
+        self._srgb = self._oklab = self._hexadecimal = self._models = None
+
+    def _set(self, model: str, value: tuple[float, ...] | str):
+        """
+        :param model: The lowercase model name
+        :param value: The packed value to cache
+        """
+        if model in _slotted:
+            setattr(self, f'_{model}', value)
+            return
+        if self._models is None:
+            self._models = {}
+        self._models[model] = value
+
+    def _model(self, model: str) -> tuple[float, ...] | str:
+        """
+        :param model: The lowercase model name
+        :return:      The cached value in that model, converted on first access
+        """
+        if model in _slotted:
+            v = getattr(self, f'_{model}')
+        else:
+            v = (self._models or {}).get(model)
+        if v is None:
+            v = _pack(rgb_to[model](self._rgb) if model in rgb_to else convert(self._rgb, 'rgb', model))
+            self._set(model, v)
         return v
 
+    # the fields used while drawing skip __getattr__ and read their slot directly
+
+    @property
+    def rgb(self) -> list[float]:
+        return list(self._rgb)
+
+    @property
+    def srgb(self) -> list[float]:
+        return list(self._srgb or self._model('srgb'))
+
+    @property
+    def oklab(self) -> list[float]:
+        return list(self._oklab or self._model('oklab'))
+
+    @property
+    def hexadecimal(self) -> str:
+        return self._hexadecimal or self._model('hexadecimal')
+
+    @property
+    def dark(self) -> bool:
+        return (self._oklab or self._model('oklab'))[0] <= 0.483
+
     def to_dict(self) -> dict[str, Any]:
         """
         Converts the Color into a dictionary of non-default parameters
         """
         if self.alpha < 5e-3:
             return {'color': '0000'}
-        names = 'alpha', 'name', 'desc_left', 'desc_right'
-        default_cls = Color('000000')
-        default = {i: getattr(default_cls, i) for i in names}
-        actual = {i: getattr(self, i) for i in names}
+        default = {'alpha': 1., 'name': '', 'desc_left': '', 'desc_right': ''}
+        actual = {i: getattr(self, i) for i in default}
         changed = {k: v for k, v in actual.items() if default[k] != v}
         # always store color, in a json-friendly format
         changed['color'] = self.hexadecimal
@@ -217,23 +387,36 @@ class Color:
         :param name: the name text field
         :param desc_left: the desc_left text field
         :param desc_right: the desc_right text field
-        :return: A base64-encoded representation of text values
+        :return: A compact json representation of text values, without the trailing empty ones
         """
-        return str(b64encode(bytes(f'{name}\0{desc_left}\0{desc_right}', 'utf-8')), 'latin1')
+        text = [name, desc_left, desc_right]
+        while text and not text[-1]:
+            text.pop()
+        return dumps(text, separators=(',', ':'))
 
     def serialize_text(self) -> str:
         """
-        :return: A base64-encoded representation of this instance's text fields
+        :return: A compact json representation of this instance's text fields
         """
         return self.data_serialize_text(self.name, self.desc_left, self.desc_right)
 
     @classmethod
     def data_deserialize_text(cls, text: str) -> list[str]:
         """
+        Also reads the base64 representation written by older versions
+
         :param text: The serialized text to decode into text fields
         :return: list containing the name, desc_left and desc_right
         """
-        return str(b64decode(bytes(text, 'latin1')), 'utf-8').split('\0')
+        if not text.startswith('['):
+            return str(b64decode(bytes(text, 'latin1')), 'utf-8').split('\0')
+        try:
+            fields = loads(text)
+        except JSONDecodeError:
+            raise ValueError('The text fields are not valid json')
+        if not isinstance(fields, list) or len(fields) > 3 or not all(isinstance(i, str) for i in fields):
+            raise ValueError('The text fields need to be a list of up to 3 strings')
+        return fields + [''] * (3 - len(fields))
 
     def deserialize_text(self, text: str) -> Color:
         """
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+from collections.abc import Sequence
+from typing import Any, Iterator
+
+from networkx.exception import NodeNotFound
+from numpy.typing import NDArray
+import numpy as np
+
+from .types import color_format
+from .conversion import convert
+from .notation import parse_hexes
+from .kernels import rgb_to, srgb_to_hexadecimal, to_rgb
+from .color import Color
+
+
+class ColorArray:
+    """
+    A batch of colors backed by NumPy arrays
+    Every model is converted for all colors at once, in a single conversion call, and cached
+
+    Attributes:
+        name:       Color names
+
+        desc_left:  Left corner descriptions
+
+        desc_right: Right corner descriptions
+
+        alpha:      (N,) transparency values
+
+        dark:       (N,) whether each color is perceptibly dark
+
+        original:   The mode these colors were created in
+
+        rgb:        (N, 3) always available, has low conversion error
+
+        <model>:    (N, 3) normalized colors in a specific model, hexadecimal is an (N,) array of strings
+
+    :param colors:     The colors to assign, either an (N, 3) array in the given model or a sequence of Color
+    :param name:       The names to display
+    :param desc_left:  Left corner descriptions
+    :param desc_right: Right corner descriptions
+    :param model:      Specifies the model of the given values, ignored for Color
+    :param alpha:      The transparency values to assign, a single value is used for all colors
+    """
+    __slots__ = 'name', 'desc_left', 'desc_right', 'alpha', 'original', '_models'
+    name: list[str]
+    desc_left: list[str]
+    desc_right: list[str]
+    alpha: NDArray
+    original: str
+    _models: dict[str, NDArray]
+
+    def __init__(
+        self,
+        colors: ColorArray | Sequence[Color] | NDArray | Sequence[Sequence[float]],
+        name: Sequence[str] | None = None,
+        desc_left: Sequence[str] | None = None,
+        desc_right: Sequence[str] | None = None,
+        model: color_format = 'srgb',
+        alpha: float | Sequence[float] | NDArray | None = None
+    ):
+        if isinstance(colors, ColorArray):
+            self._models = dict(colors._models)
+            self.original = colors.original
+            n = len(colors)
+            name = name or colors.name
+            desc_left = desc_left or colors.desc_left
+            desc_right = desc_right or colors.desc_right
+            alpha = colors.alpha if alpha is None else alpha
+        elif len(colors) and isinstance(colors[0], Color):
+            # keep the common original model to avoid conversion error, fall back to rgb for mixed models
+            originals = {'hexadecimal' if c.original == 'css color 3' else c.original for c in colors}
+            self.original = originals.pop() if len(originals) == 1 else 'rgb'
+            if self.original == 'hexadecimal':
+                # hex strings decode exactly to sRGB, which converts better than the strings themselves
+                hexes, srgb, _ = parse_hexes([c.hexadecimal for c in colors])
+                self.original = 'srgb'
+                self._models = {'srgb': srgb, 'hexadecimal': np.array(hexes, dtype=str)}
+            else:
+                self._models = {self.original: np.array(
+                    [getattr(c, self.original) for c in colors], dtype=float).reshape(-1, 3)}
+            self._models['rgb'] = np.array([c.rgb for c in colors], dtype=float).reshape(-1, 3)
+            n = len(colors)
+            name = name or [c.name for c in colors]
+            desc_left = desc_left or [c.desc_left for c in colors]
+            desc_right = desc_right or [c.desc_right for c in colors]
+            alpha = [c.alpha for c in colors] if alpha is None else alpha
+        else:
+            model = model.lower()
+            values = np.asarray(colors, dtype=float).reshape(-1, 3)
+            self._models = {model: values}
+            self.original = model
+            n = len(values)
+            # catch conversion errors early by doing one conversion greedily
+            # also always have RGB set because it converts well
+            if model in to_rgb:
+                self._models['rgb'] = to_rgb[model](values)
+            elif model != 'rgb':
+                try:
+                    self._models['rgb'] = np.asarray(convert(values, model, 'rgb')).reshape(-1, 3)
+                except NodeNotFound:
+                    raise ValueError(f'Target model <{model}> is not available')
+        self.name = list(name or [''] * n)
+        self.desc_left = list(desc_left or [''] * n)
+        self.desc_right = list(desc_right or [''] * n)
+        self.alpha = np.clip(np.broadcast_to(np.asarray(1. if alpha is None else alpha, dtype=float), (n,)), 0., 1.)
+        if not len(self.name) == len(self.desc_left) == len(self.desc_right) == n:
+            raise ValueError('Text fields must have one value per color')
+
+    @classmethod
+    def from_hex(
+        cls,
+        colors: Sequence[str],
+        name: Sequence[str] | None = None,
+        desc_left: Sequence[str] | None = None,
+        desc_right: Sequence[str] | None = None,
+        alpha: float | Sequence[float] | NDArray | None = None
+    ) -> ColorArray:
+        """
+        Parses hex strings or css color names in bulk, see ColorArray for the parameters
+        The transparency in 4 and 8 digit strings takes precedence over alpha
+        """
+        hexes, srgb, hex_alpha = parse_hexes(colors)
+        alpha = np.broadcast_to(np.asarray(1. if alpha is None else alpha, dtype=float), hex_alpha.shape)
+        ret = cls(srgb, name, desc_left, desc_right, 'srgb', np.where(np.isnan(hex_alpha), alpha, hex_alpha))
+        ret._models['hexadecimal'] = np.array(hexes, dtype=str)
+        return ret
+
+    def __len__(self) -> int:
+        return len(self.alpha)
+
+    def __getattr__(self, item: str) -> Any:
+        """
+        Only called when the attribute is not set, loads the models lazily
+        """
+        if item.startswith('_'):
+            raise AttributeError(item)
+        model = item.lower()
+        try:
+            return self._models[model]
+        except KeyError:
+            pass
+        match model:
+            case 'dark':
+                return self.oklab[:, 0] <= 0.483
+            case 'hexadecimal':
+                # a bulk conversion scales every color down when any is out of gamut, so each is handled on its own
+                self._models[model] = np.array(srgb_to_hexadecimal(self.srgb), dtype=str)
+                return self._models[model]
+            case _ if model in rgb_to:
+                self._models[model] = rgb_to[model](self._models['rgb'])
+                return self._models[model]
+            case _ if model in Color._conversions:
+                v = convert(self._models[self.original], self.original, model)
+                self._models[model] = np.asarray(v).reshape(-1, 3)
+                return self._models[model]
+            case x:
+                raise AttributeError(f'Attribute <{x}> not found and not loaded lazily.')
+
+    def __getitem__(self, item: int | slice) -> Color | ColorArray:
+        if isinstance(item, slice):
+            ret = ColorArray.__new__(ColorArray)
+            ret._models = {k: v[item] for k, v in self._models.items()}
+            ret.original = self.original
+            ret.alpha = self.alpha[item]
+            ret.name = self.name[item]
+            ret.desc_left = self.desc_left[item]
+            ret.desc_right = self.desc_right[item]
+            return ret
+        return Color.from_models(
+            {k: v[item] for k, v in self._models.items()},
+            self.original,
+            self.name[item],
+            self.desc_left[item],
+            self.desc_right[item],
+            float(self.alpha[item])
+        )
+
+    def __iter__(self) -> Iterator[Color]:
+        return (self[i] for i in range(len(self)))
+
+    def to_colors(self, *models: color_format) -> list[Color]:
+        """
+        :param models: Models to convert in bulk beforehand, so that the colors do not convert them one by one
+        :return: The list of individual colors
+        """
+        for i in models:
+            getattr(self, i)
+        # plain Python values are much faster to hand out than NumPy scalars
+        values = {
+            k: v.tolist() if k == 'hexadecimal' else list(map(tuple, v.tolist()))
+            for k, v in self._models.items()
+        }
+        return [
+            Color.from_models({k: v[i] for k, v in values.items()}, self.original, n, dl, dr, a)
+            for i, (n, dl, dr, a) in enumerate(zip(self.name, self.desc_left, self.desc_right, self.alpha.tolist()))
+        ]
+
+    def to_dicts(self) -> list[dict[str, Any]]:
+        """
+        Converts the colors into dictionaries of non-default parameters, same as Color.to_dict
+        """
+        ret = []
+        for hx, a, n, dl, dr in zip(self.hexadecimal, self.alpha, self.name, self.desc_left, self.desc_right):
+            if a < 5e-3:
+                ret.append({'color': '0000'})
+                continue
+            changed = {'alpha': float(a)} if a != 1. else {}
+            changed |= {k: v for k, v in (('name', n), ('desc_left', dl), ('desc_right', dr)) if v}
+            changed['color'] = str(hx)
+            ret.append(changed)
+        return ret
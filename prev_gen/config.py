@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-from typing import Callable, Sequence
+from typing import IO, Callable, Sequence
 from abc import ABC, abstractmethod
 from os.path import exists
-from copy import deepcopy
+from io import TextIOBase
 
+from .color_array import ColorArray
 from .types import config_format
 from .settings import Settings
 from .color import Color
@@ -20,13 +21,35 @@ class Config:
 
     @classmethod
     def read(cls, file: str, output: config_format | None = None) -> BaseConfig:
-        if output is None and exists(file):
+        if output is None and _is_file(file):
             output = file.split('.')[-1]
         try:
             return {'yaml': YamlConfig, 'json': JsonConfig, 'toml': TomlConfig, 'py': PythonConfig}[output].read(file)
         except KeyError:
             raise ValueError(f'Invalid config mode: <{output}>')
 
+    @classmethod
+    def loads(cls, data: str | bytes | memoryview, output: config_format) -> BaseConfig:
+        try:
+            return {'yaml': YamlConfig, 'json': JsonConfig, 'toml': TomlConfig, 'py': PythonConfig}[output].loads(data)
+        except KeyError:
+            raise ValueError(f'Invalid config mode: <{output}>')
+
+    @classmethod
+    def load(cls, fp: IO, output: config_format) -> BaseConfig:
+        try:
+            return {'yaml': YamlConfig, 'json': JsonConfig, 'toml': TomlConfig, 'py': PythonConfig}[output].load(fp)
+        except KeyError:
+            raise ValueError(f'Invalid config mode: <{output}>')
+
+
+def _is_file(file: str) -> bool:
+    """
+    :param file: A filename or the contents of a file
+    :return:     Whether it is an existing file, contents with several lines are not looked up on disk
+    """
+    return '\n' not in file and exists(file)
+
 
 class BaseConfig(ABC):
     """
@@ -68,7 +91,8 @@ class BaseConfig(ABC):
         """
         :param palette: The palette to transform to a formatted string
         """
-        self.palette = deepcopy(palette)
+        # the palette is only read, so it is kept without copying it
+        self.palette = palette
         if isinstance(palette[0], Settings):
             s = palette[0].to_dict()
             c: list[list] = palette[1:]
@@ -78,9 +102,7 @@ class BaseConfig(ABC):
         else:
             s = {}
             c: list[list] = palette
-        for i, x in enumerate(c):
-            for j, y in enumerate(x):
-                c[i][j] = y.to_dict()
+        c = [x.to_dicts() if isinstance(x, ColorArray) else [y.to_dict() for y in x] for x in c]
         data = self._serialize()({'settings': s})
         data = self._serialize2(data)({'palette': c})
         self.data = data
@@ -97,10 +119,28 @@ class BaseConfig(ABC):
         :param file: The filename or loaded Format-data to use
         :return: The loaded Format instance
         """
-        if exists(file):
+        if _is_file(file):
             with open(file, 'r') as f:
                 file = f.read()
-        data = cls._deserialize()(file)
+        return cls.loads(file)
+
+    @classmethod
+    def load(cls, fp: IO) -> BaseConfig:
+        """
+        :param fp: A text or binary file object to read the Format-data from
+        :return: The loaded Format instance
+        """
+        return cls.loads(fp.read())
+
+    @classmethod
+    def loads(cls, data: str | bytes | memoryview) -> BaseConfig:
+        """
+        :param data: The Format-data, never looked up on disk, bytes are read as utf-8
+        :return: The loaded Format instance
+        """
+        if not isinstance(data, str):
+            data = str(data, 'utf-8')
+        data = cls._deserialize()(data)
         if 'settings' not in data:
             data['settings'] = {}
         colors, settings = data['palette'], data['settings']
@@ -108,8 +148,15 @@ class BaseConfig(ABC):
             for j, b in enumerate(a):
                 if isinstance(b, str):
                     colors[i][j] = Color([float(x) for x in b[0].strip('()').split(', ')], *b[1:])
+                # strings are the common case, they skip the type dispatch
+                elif isinstance(b, dict) and isinstance(b.get('color'), str):
+                    colors[i][j] = Color.from_css(
+                        b['color'], b.get('name', ''), b.get('desc_left', ''), b.get('desc_right', ''), b.get('alpha')
+                    )
                 elif isinstance(b, dict):
                     colors[i][j] = Color(**b)
+                elif isinstance(b, Sequence) and isinstance(b[0], str):
+                    colors[i][j] = Color.from_css(*b[:4], *b[5:6])
                 elif isinstance(b, Sequence):
                     colors[i][j] = Color(*b)
                 elif isinstance(b, Color):
@@ -125,13 +172,32 @@ class BaseConfig(ABC):
             f.write(self.data)
         return self
 
+    def dumps(self) -> str:
+        """
+        :return: The format string
+        """
+        return self.data
+
+    def dump(self, fp: IO) -> BaseConfig:
+        """
+        :param fp: A text or binary file object to write to, binary ones get utf-8
+        :return: Self, for method chaining
+        """
+        fp.write(self.data if isinstance(fp, TextIOBase) else self.data.encode('utf-8'))
+        return self
+
 
 class YamlConfig(BaseConfig):
     @classmethod
     def _serialize(cls) -> Callable[[dict], str]:
-        from yaml import safe_dump
+        from yaml import dump
+        # the C dumper is an order of magnitude faster, if PyYAML was built with it
+        try:
+            from yaml import CSafeDumper as Dumper
+        except ImportError:
+            from yaml import SafeDumper as Dumper
         return lambda val: (
-            safe_dump(val, sort_keys=False)
+            dump(val, Dumper=Dumper, sort_keys=False)
             if val.get('settings', None)
             or val.get('palette')
             else ''
@@ -139,8 +205,13 @@ class YamlConfig(BaseConfig):
 
     @classmethod
     def _deserialize(cls) -> Callable[[str], dict]:
-        from yaml import safe_load
-        return safe_load
+        from yaml import load
+        # the C loader is an order of magnitude faster, if PyYAML was built with it
+        try:
+            from yaml import CSafeLoader as Loader
+        except ImportError:
+            from yaml import SafeLoader as Loader
+        return lambda x: load(x, Loader=Loader)
 
 
 class JsonConfig(BaseConfig):
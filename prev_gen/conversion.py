@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+from typing import Any, Callable, get_args
+from threading import Lock, get_ident
+from os.path import join, exists
+from functools import lru_cache
+from itertools import pairwise
+from os import getpid, replace
+from json import dump, load
+
+from colour.graph.conversion import CONVERSION_SPECIFICATIONS
+from colour.utilities import domain_range_scale
+from colour import __version__ as colour_version
+
+from .types import color_format
+from .cache import cache_dir
+
+# every model the conversion graph knows about, without building the graph
+models: frozenset[str] = frozenset(get_args(color_format))
+
+# the edges of the conversion graph, keyed by (source, target) model
+_edges: dict[tuple[str, str], Callable] = {
+    (i.source, i.target): i.conversion_function
+    for i in CONVERSION_SPECIFICATIONS
+}
+
+# resolved conversion paths as lists of models, shared between processes through the cache directory
+_paths: dict[str, list[str]] | None = None
+_paths_lock = Lock()
+
+# colour-science keeps its domain-range scale in a global, conversions set and restore it one at a time
+_scale_lock = Lock()
+
+
+def _paths_file() -> str:
+    return join(cache_dir(), 'conversion_paths.json')
+
+
+def _load_paths() -> dict[str, list[str]]:
+    global _paths
+    if _paths is None:
+        _paths = {}
+        try:
+            if exists(fn := _paths_file()):
+                with open(fn, 'r') as f:
+                    data = load(f)
+                # paths depend on the graph, which can change between versions
+                if data.get('colour') == colour_version:
+                    _paths = data['paths']
+        except (OSError, ValueError, KeyError):
+            pass
+    return _paths
+
+
+def _save_paths(paths: dict[str, list[str]]):
+    try:
+        fn = _paths_file()
+        # write next to the target and swap, so concurrent processes and threads never read a partial file
+        tmp = f'{fn}.{getpid()}.{get_ident()}'
+        with open(tmp, 'w') as f:
+            dump({'colour': colour_version, 'paths': paths}, f)
+        replace(tmp, fn)
+    except OSError:
+        pass
+
+
+@lru_cache(maxsize=1)
+def _graph() -> Any:
+    """
+    Only built when a path is not known yet
+    """
+    # noinspection PyProtectedMember
+    from colour.graph.conversion import _build_graph
+    return _build_graph()
+
+
+def _resolve(source: str, target: str) -> list[str]:
+    with _paths_lock:
+        paths = _load_paths()
+        key = f'{source}|{target}'
+        if key not in paths:
+            from networkx import shortest_path
+            paths[key] = shortest_path(_graph(), source, target)
+            _save_paths(paths)
+        return paths[key]
+
+
+@lru_cache(maxsize=256)
+def conversion_path(source: str, target: str) -> tuple[Callable, ...]:
+    """
+    Resolves the conversion between two models once, later calls are served from memory
+    Use conversion_path.cache_info() for statistics
+
+    :param source: The model to convert from
+    :param target: The model to convert to
+    :return:       The conversion functions to apply in order
+    """
+    return tuple(_edges[a, b] for a, b in pairwise(_resolve(source, target)))
+
+
+def convert(a: Any, source: str, target: str) -> Any:
+    """
+    Equivalent of colour.convert, without resolving the path through the graph every time
+
+    :param a:      The value to convert
+    :param source: The model to convert from
+    :param target: The model to convert to
+    :return:       The converted value
+    """
+    path = conversion_path(source.lower(), target.lower())
+    with _scale_lock, domain_range_scale('1'):
+        for f in path:
+            a = f(a)
+    return a
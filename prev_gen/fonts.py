@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from os.path import abspath, dirname, getmtime, getsize, isfile, join, splitext
+from importlib.util import find_spec
+from urllib.error import URLError
+from functools import lru_cache
+from base64 import b64encode
+from hashlib import sha256
+from json import dumps
+from io import BytesIO
+
+from .cache import FontCache
+
+# the font bundled with the library, used by default in both output formats
+bundled = join(dirname(abspath(__file__)), 'nunito.ttf')
+
+# the weight of the bundled font, any other weight has to come from elsewhere
+_bundled_weight = 700
+
+# css format and mime type of embeddable font files
+_formats = {
+    '.ttf': ('truetype', 'font/ttf'),
+    '.otf': ('opentype', 'font/otf'),
+    '.woff': ('woff', 'font/woff'),
+    '.woff2': ('woff2', 'font/woff2')
+}
+
+# the embedded fonts kept between runs, the memory tier is the lru_cache of _font_css
+_font_cache = FontCache(memory_size=0, disk_size=16 << 20)
+
+
+def local_font(family: str, opts: dict) -> str | None:
+    """
+    :param family: The font name from the settings, or a path to a font file
+    :param opts:   The font options from the settings
+    :return:       Path of the font file to embed, or None if there is no local file for it
+    """
+    if family == 'Nunito' and set(opts.items()) <= {('wght', _bundled_weight)}:
+        return bundled
+    for fn in (family, family + '.ttf'):
+        if isfile(fn) and splitext(fn)[1].lower() in _formats:
+            return abspath(fn)
+    return None
+
+
+def _subset(fn: str, text: str) -> tuple[bytes, str]:
+    """
+    Keeps only the glyphs needed for the text, if fontTools is installed
+
+    :param fn:   Path of the font file
+    :param text: The characters to keep
+    :return:     The font data and its file extension
+    """
+    try:
+        from fontTools.subset import Options, Subsetter
+        from fontTools.ttLib import TTFont
+    except ImportError:
+        with open(fn, 'rb') as f:
+            return f.read(), splitext(fn)[1].lower()
+    # woff2 compresses better, but needs brotli
+    flavor = 'woff2' if find_spec('brotli') else 'woff'
+    # the modification time would otherwise change with every subset, svg output stays the same between runs
+    font = TTFont(fn, recalcTimestamp=False)
+    subsetter = Subsetter(Options())
+    subsetter.populate(text=text)
+    subsetter.subset(font)
+    font.flavor = flavor
+    with BytesIO() as f:
+        font.save(f)
+        return f.getvalue(), f'.{flavor}'
+
+
+def _local_css(family: str, fn: str, weight: int | None, text: str) -> str:
+    data, ext = _subset(fn, text)
+    fmt, mime = _formats[ext]
+    weight = f'font-weight:{weight};' if weight is not None else ''
+    return (
+        f'@font-face{{font-family:"{family}";{weight}'
+        f'src:url(data:{mime};base64,{str(b64encode(data), "latin1")}) format("{fmt}");}}'
+    )
+
+
+def _google_css(family: str, opts: dict, text: str) -> str:
+    from drawsvg.font_embed import download_google_font_css
+    return download_google_font_css(family, text=text, **opts)
+
+
+@lru_cache(maxsize=64)
+def _font_css(family: str, opts: tuple[tuple[str, object], ...], text: str) -> str:
+    opts = dict(opts)
+    fn = local_font(family, opts)
+    # local files are keyed by their state as well, so that changing them invalidates the cache
+    # without fontTools they are embedded whole, the same file for any text
+    subset = fn is None or find_spec('fontTools') is not None
+    key = [family, opts, text if subset else None, [fn, getmtime(fn), getsize(fn)] if fn else None]
+    key = sha256(dumps(key).encode('utf-8')).hexdigest()
+    if (data := _font_cache.get(key, 'css')) is not None:
+        return data.decode('utf-8')
+    if fn is not None:
+        css = _local_css(family, fn, opts.get('wght'), text)
+    else:
+        css = _google_css(family, opts, text)
+    _font_cache.put(key, 'css', css.encode('utf-8'))
+    return css
+
+
+def font_css(family: str, opts: dict, text: str) -> str:
+    """
+    Creates the css that embeds a font into an svg, limited to the glyphs in text
+    Local font files and the bundled font need no network, other fonts are downloaded from Google Fonts once
+    Results are cached on disk and in memory, use font_css.cache_info() for statistics of the latter
+
+    :param family: The font name from the settings, or a path to a font file
+    :param opts:   The font options from the settings, the Google Fonts API parameters
+    :param text:   The characters that will be displayed
+    :return:       The @font-face css with the font data embedded
+    """
+    try:
+        return _font_css(family, tuple(sorted(opts.items())), ''.join(sorted(set(text))))
+    except URLError:
+        raise ValueError(
+            f'\033[31;1mError: \'{family}\' with opts \'{opts}\' is not available in Google Fonts'
+            ' and there is no local font file with that name'
+        )
+
+
+font_css.cache_info = _font_css.cache_info
@@ -0,0 +1,129 @@
+"""
+NumPy versions of the conversions on the hot path
+They follow the colour-science definitions, but skip the conversion graph and its bookkeeping
+All of them work on a single color or on an (N, 3) array of colors
+"""
+from typing import Callable
+
+from colour.models.oklab import MATRIX_1_LMS_TO_XYZ, MATRIX_1_XYZ_TO_LMS, MATRIX_2_LAB_TO_LMS, MATRIX_2_LMS_TO_LAB
+from colour.models import RGB_COLOURSPACE_sRGB
+from numpy.typing import ArrayLike, NDArray
+import numpy as np
+
+# linear RGB goes through CIE XYZ to reach Oklab, the two matrices on each side are merged into one
+# transposed, because the colors are rows
+_RGB_TO_LMS = (MATRIX_1_XYZ_TO_LMS @ RGB_COLOURSPACE_sRGB.matrix_RGB_to_XYZ).T
+_LMS_TO_RGB = (RGB_COLOURSPACE_sRGB.matrix_XYZ_to_RGB @ MATRIX_1_LMS_TO_XYZ).T
+_LMS_TO_LAB = MATRIX_2_LMS_TO_LAB.T
+_LAB_TO_LMS = MATRIX_2_LAB_TO_LMS.T
+
+
+def srgb_to_rgb(a: ArrayLike) -> NDArray:
+    """
+    sRGB electro-optical transfer function, the 'srgb' to 'rgb' conversion
+
+    :param a: Values in sRGB
+    :return:  Values in linear RGB
+    """
+    a = np.asarray(a, dtype=float)
+    return np.where(
+        a <= 0.0031308 * 12.92,
+        a / 12.92,
+        np.sign(a) * np.abs((a + 0.055) / 1.055) ** 2.4
+    )
+
+
+def rgb_to_srgb(a: ArrayLike) -> NDArray:
+    """
+    Inverse sRGB electro-optical transfer function, the 'rgb' to 'srgb' conversion
+
+    :param a: Values in linear RGB
+    :return:  Values in sRGB
+    """
+    a = np.asarray(a, dtype=float)
+    return np.where(
+        a <= 0.0031308,
+        a * 12.92,
+        1.055 * np.sign(a) * np.abs(a) ** (1 / 2.4) - 0.055
+    )
+
+
+def srgb_to_rgb_single(a: tuple[float, float, float]) -> tuple[float, ...]:
+    """
+    srgb_to_rgb for a single color in plain Python, NumPy is slower for only three values
+
+    :param a: Values in sRGB
+    :return:  Values in linear RGB
+    """
+    return tuple(
+        i / 12.92 if i <= 0.0031308 * 12.92 else ((i + 0.055) / 1.055) ** 2.4
+        for i in a
+    )
+
+
+def rgb_to_oklab(a: ArrayLike) -> NDArray:
+    """
+    :param a: Values in linear RGB
+    :return:  Values in Oklab
+    """
+    return np.cbrt(np.asarray(a, dtype=float) @ _RGB_TO_LMS) @ _LMS_TO_LAB
+
+
+def oklab_to_rgb(a: ArrayLike) -> NDArray:
+    """
+    :param a: Values in Oklab
+    :return:  Values in linear RGB
+    """
+    return (np.asarray(a, dtype=float) @ _LAB_TO_LMS) ** 3 @ _LMS_TO_RGB
+
+
+def oklab_to_oklch(a: ArrayLike) -> NDArray:
+    """
+    The hue is normalized to [0, 1], like colour-science does with its domain-range scale set to '1'
+
+    :param a: Values in Oklab
+    :return:  Values in OkLCh
+    """
+    a = np.asarray(a, dtype=float)
+    h = np.degrees(np.arctan2(a[..., 2], a[..., 1])) % 360 / 360
+    return np.stack((a[..., 0], np.hypot(a[..., 1], a[..., 2]), h), axis=-1)
+
+
+def oklch_to_oklab(a: ArrayLike) -> NDArray:
+    """
+    :param a: Values in OkLCh, with the hue normalized to [0, 1]
+    :return:  Values in Oklab
+    """
+    a = np.asarray(a, dtype=float)
+    h = np.radians(a[..., 2] * 360)
+    return np.stack((a[..., 0], a[..., 1] * np.cos(h), a[..., 1] * np.sin(h)), axis=-1)
+
+
+def srgb_to_hexadecimal(a: ArrayLike) -> list[str]:
+    """
+    Follows colour-science for out of gamut colors, negative values are clipped
+    and colors brighter than 1 are scaled down in linear RGB, but every color is handled on its own
+
+    :param a: Values in sRGB
+    :return:  The colors as '#rrggbb'
+    """
+    a = np.clip(np.asarray(a, dtype=float).reshape(-1, 3), 0, None)
+    if (over := (a > 1).any(axis=1)).any():
+        lin = srgb_to_rgb(a[over])
+        a[over] = rgb_to_srgb(lin / lin.max(axis=1, keepdims=True))
+    return [f'#{r:02x}{g:02x}{b:02x}' for r, g, b in (a * 255).astype(np.uint8).tolist()]
+
+
+# conversions from linear RGB that skip colour-science, keyed by model
+rgb_to: dict[str, Callable[[ArrayLike], NDArray]] = {
+    'srgb': rgb_to_srgb,
+    'oklab': rgb_to_oklab,
+    'oklch': lambda a: oklab_to_oklch(rgb_to_oklab(a))
+}
+
+# conversions to linear RGB that skip colour-science, keyed by model
+to_rgb: dict[str, Callable[[ArrayLike], NDArray]] = {
+    'srgb': srgb_to_rgb,
+    'oklab': oklab_to_rgb,
+    'oklch': lambda a: oklab_to_rgb(oklch_to_oklab(a))
+}
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
-from typing import Any, Sequence, TypeAlias
+from typing import Any, Iterator, Sequence, TypeAlias
 from dataclasses import dataclass
+from json import dumps, loads
 
+from numpy.typing import NDArray
+import numpy as np
+
+from .color_array import ColorArray
 from .distance import Distance
 from .settings import Settings
 from .color import Color
@@ -14,26 +19,34 @@ usage 1
   list of
     Settings (as the first element) (or dict)
     Color (or dict or list)
+  or a ColorArray
 """
-u1: TypeAlias = list[Color | dict[str, Any] | list | Settings]
+u1: TypeAlias = list[Color | dict[str, Any] | list | Settings] | ColorArray
 """
 usage 2
   list of
     Settings (as the first element) (or dict) 
-    list of Color (or dict or list)
+    list of Color (or dict or list) or ColorArray
 """
-u2: TypeAlias = list[dict[str, Any] | list[Color | dict[str, Any] | list[Color]] | Settings]
+u2: TypeAlias = list[dict[str, Any] | list[Color | dict[str, Any] | list[Color]] | ColorArray | Settings]
+
+# the empty tile that pads short rows, shared by every palette so it must never be modified
+empty = Color('000000', alpha=0.)
 
 
 @dataclass(slots=True)
 class Palette:
     # noinspection PyUnresolvedReferences
     """
-    A table of colors, which you can iterate over
+    A table of colors, which you can iterate over, index and slice
+    The positions are computed once at creation, iterating only pairs them with the colors
+    so any number of loops, in any number of threads, can go over the same palette
 
     Attributes:
         colors:   List of colors, flattened
 
+        layout:   Integer array with the x, y, width and height in pixels of every tile, in the order of colors
+
         settings: The settings available to the user
 
         height:   Height of the table in fields
@@ -46,7 +59,7 @@ class Palette:
     settings: Settings
     height: int
     width: int
-    _iter: int
+    layout: NDArray
 
     @property
     def size(self) -> Distance:
@@ -70,20 +83,26 @@ class Palette:
         return colors
 
     def _calc_size(self, colors: u1 | u2) -> list[Color]:
-        # get the explicitly given size and flatten list
+        # colors given in bulk get converted in bulk, for the models the previewers use
+        if isinstance(colors, ColorArray):
+            colors = colors.to_colors('srgb', 'oklab', 'hexadecimal')
+        elif isinstance(colors[0], list | ColorArray):
+            colors = [i.to_colors('srgb', 'oklab', 'hexadecimal') if isinstance(i, ColorArray) else i for i in colors]
+        # get the explicitly given size and flatten list, the rows given are left as they are
         if isinstance(colors[0], list):
             self.height = len(colors)
             self.width = max(len(i) for i in colors)
+            flat = []
             for i in colors:
-                while len(i) < self.width:
-                    i.append(Color('000000', alpha=0.))
-            colors = [
-                Color(**j) if isinstance(j, dict)
-                else Color(*j) if isinstance(j, Sequence)
-                else j
-                for i in colors
-                for j in i
-            ]
+                flat += [
+                    Color(**j) if isinstance(j, dict)
+                    else Color(*j) if isinstance(j, Sequence)
+                    else j
+                    for j in i
+                ]
+                # short rows are padded with empty tiles
+                flat += [empty] * (self.width - len(i))
+            colors = flat
         # calculate the correct size
         else:
             self.height = int(len(colors) ** 0.5)
@@ -100,28 +119,95 @@ class Palette:
         colors = self._get_settings(colors)
         colors = self._calc_size(colors)
         self.colors = colors
-        self._iter = 0
-
-    def __iter__(self) -> Palette:
-        self._iter = 0
-        return self
-
-    def __next__(self) -> Tile:
-        i = self._iter
-        self._iter += 1
-        if i >= len(self.colors):
-            self._iter = 0
-            raise StopIteration
-        return Tile(
-            Distance(
-                i % self.width * self.settings.grid_width,
-                i // self.width * self.settings.grid_height
-            ),
-            # the size is decreased by one because the tiles would overlap
-            # which you can see if you have an empty tile somewhere
-            Distance(
-                self.settings.grid_width - 1,
-                self.settings.grid_height - 1
-            ),
-            self.colors[i]
-        )
+        self.layout = self._calc_layout()
+
+    def _calc_layout(self) -> NDArray:
+        s = self.settings
+        i = np.arange(len(self.colors))
+        # the size is decreased by one because the tiles would overlap
+        # which you can see if you have an empty tile somewhere
+        return np.stack((
+            i % self.width * s.grid_width,
+            i // self.width * s.grid_height,
+            np.full_like(i, s.grid_width - 1),
+            np.full_like(i, s.grid_height - 1)
+        ), axis=1)
+
+    def serialize(self) -> str:
+        """
+        Transparent tiles are written as '0000', the others as their hex value with the transparency if any
+        followed by their texts if they have any
+
+        :return: A compact json representation of all tiles, row by row
+        """
+        rows = []
+        for i in range(0, self.width * self.height, self.width):
+            row = []
+            for c in self.colors[i:i + self.width]:
+                if c.alpha < 5e-3:
+                    row.append('0000')
+                    continue
+                hx = c.hexadecimal if c.alpha == 1. else f'{c.hexadecimal}{round(c.alpha * 255):02x}'
+                text = [c.name, c.desc_left, c.desc_right]
+                while text and not text[-1]:
+                    text.pop()
+                row.append([hx, *text] if text else hx)
+            rows.append(row + ['0000'] * (self.width - len(row)))
+        return dumps({'v': 1, 'palette': rows}, separators=(',', ':'))
+
+    @classmethod
+    def deserialize(cls, data: str) -> list[list[Color]]:
+        """
+        :param data: The serialized representation to decode
+        :return:     The colors, row by row
+        """
+        data = loads(data)
+        if data.get('v') != 1:
+            raise ValueError(f'Unsupported palette version <{data.get("v")}>')
+        rows = data['palette']
+        tiles = [(i, '', '', '') if isinstance(i, str) else (*i, '', '', '')[:4] for r in rows for i in r]
+        colors = ColorArray.from_hex(*zip(*tiles)).to_colors() if tiles else []
+        ret = []
+        start = 0
+        for r in rows:
+            ret.append(colors[start:start + len(r)])
+            start += len(r)
+        return ret
+
+    def _tiles(self, indices: range | NDArray) -> list[Tile]:
+        """
+        :param indices: Indices of the tiles to create
+        :return:        The tiles, they share one size object as all tiles are the same size
+        """
+        size = Distance(self.settings.grid_width - 1, self.settings.grid_height - 1)
+        positions = self.layout[indices, :2].tolist()
+        return [Tile(Distance(x, y), size, self.colors[i]) for i, (x, y) in zip(indices, positions)]
+
+    def __len__(self) -> int:
+        return len(self.colors)
+
+    def __iter__(self) -> Iterator[Tile]:
+        size = Distance(self.settings.grid_width - 1, self.settings.grid_height - 1)
+        return (Tile(Distance(x, y), size, c) for (x, y), c in zip(self.layout[:, :2].tolist(), self.colors))
+
+    def __getitem__(self, item: int | slice) -> Tile | list[Tile]:
+        """
+        :param item: The index of a tile, or a slice of them, in the order of colors
+        """
+        if isinstance(item, slice):
+            return self._tiles(range(*item.indices(len(self))))
+        if not -len(self) <= item < len(self):
+            raise IndexError(f'Tile index <{item}> out of range')
+        return self._tiles(range(item % len(self), item % len(self) + 1))[0]
+
+    def rows(self) -> Iterator[list[Tile]]:
+        """
+        :return: The tiles row by row, the last row can be shorter
+        """
+        return (self[i:i + self.width] for i in range(0, len(self), self.width))
+
+    def columns(self) -> Iterator[list[Tile]]:
+        """
+        :return: The tiles column by column, the last columns can be shorter
+        """
+        return (self[i::self.width] for i in range(min(self.width, len(self))))
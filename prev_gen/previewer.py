@@ -1,64 +1,326 @@
-from inspect import currentframe, getabsfile
-from urllib.error import HTTPError
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from importlib.metadata import PackageNotFoundError, version
+from typing import BinaryIO, Iterable, Iterator, Sequence
+from multiprocessing.shared_memory import SharedMemory
+from os import close, cpu_count, remove, write
+from os.path import getmtime, getsize, isfile
+from dataclasses import dataclass, field
+from threading import Thread, get_ident
+from webbrowser import open as browse
+from xml.sax.saxutils import escape
+from zlib import compressobj, crc32
+from math import ceil, floor, modf
 from xml.etree import ElementTree
-from webbrowser import open
-from os.path import dirname
+from collections import Counter
+from functools import lru_cache
+from tempfile import mkstemp
+from itertools import repeat
+from hashlib import sha256
+from struct import pack
+from io import BytesIO
+from json import dumps
 from time import sleep
-from os import remove
 
-from drawsvg import Drawing, DrawingElement, Rectangle, Text
 from PIL import Image, ImageDraw, ImageFont
 from PIL.PngImagePlugin import PngInfo
+from drawsvg import Drawing, Text
+from numpy.typing import NDArray
+import numpy as np
 
+from .kernels import oklab_to_rgb, rgb_to_oklab, rgb_to_srgb, srgb_to_hexadecimal
+from .reverser import _palette_chunk, _palette_keys, _png_signature, _xmp_namespace
+from .fonts import bundled, font_css, local_font
+from .cache import RenderCache, render_cache
 from .palette import Palette, u1, u2
 from .types import image_format
-from .distance import Distance
 from .settings import Settings
 from .color import Color
 
 
+@lru_cache(maxsize=64)
+def _load_font(font: str, size: int, _thread: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font, size=size)
+
+
+def load_font(font: str, size: int) -> ImageFont.FreeTypeFont:
+    """
+    Parses each font once per thread, every render in the thread shares the loaded fonts
+    FreeType fonts can not be used by several threads at once, so each thread gets its own
+    Use load_font.cache_info() for statistics
+
+    :param font: Path or name of the TrueType font
+    :param size: The font size in pixels
+    :return:     The loaded font
+    """
+    return _load_font(font, size, get_ident())
+
+
+load_font.cache_info = _load_font.cache_info
+
+
+def _open_file(fn: str, temporary: bool):
+    browse(fn)
+    # the viewer gets some time to read a temporary file before it is removed
+    if temporary:
+        sleep(10)
+        try:
+            remove(fn)
+        except OSError:
+            pass
+
+
+def view(data: str | bytes, suffix: str = '.svg') -> str:
+    """
+    Opens an image in the default viewer without blocking the caller
+    The image is written to a uniquely named temporary file, which is removed in the background afterwards
+
+    :param data:   The image contents
+    :param suffix: The file extension, which decides the viewer
+    :return:       The path of the temporary file
+    """
+    fd, fn = mkstemp(suffix, 'prev_gen_')
+    try:
+        write(fd, data.encode('utf-8') if isinstance(data, str) else data)
+    finally:
+        close(fd)
+    Thread(target=_open_file, args=(fn, True), daemon=True).start()
+    return fn
+
+
+@lru_cache(maxsize=4096)
+def _advance(font: ImageFont.FreeTypeFont, char: str) -> float:
+    return font.getlength(char)
+
+
+@lru_cache(maxsize=8192)
+def _sprite(font: ImageFont.FreeTypeFont, text: str, anchor: str, start: tuple[float, float]) -> tuple[object, tuple]:
+    """
+    Rasterizes a text once, every tile with the same text reuses the mask
+    Fonts are loaded per thread, so the masks of a thread are only used by it
+
+    :param font:   The loaded font
+    :param text:   A single line of text
+    :param anchor: The anchor of the text
+    :param start:  The fraction of the position, which PIL places the glyphs by
+    :return:       The alpha mask of the text and its offset from the position
+    """
+    return font.getmask2(text, 'L', anchor=anchor, start=start)
+
+
+def bar_colors(oklab: NDArray) -> NDArray:
+    """
+    :param oklab: Colors of the tiles in Oklab, (N, 3)
+    :return:      Colors of their bars in sRGB, (N, 3)
+    """
+    return rgb_to_srgb(oklab_to_rgb(np.asarray(oklab, dtype=float) * (0.9, 1., 1.)))
+
+
+def text_colors(oklab: NDArray) -> NDArray:
+    """
+    :param oklab: Colors of the tiles in Oklab, (N, 3)
+    :return:      Colors of their text in sRGB, (N, 3)
+    """
+    oklab = np.array(oklab, dtype=float)
+    lightness = oklab[..., 0]
+    oklab[..., 0] = np.where(lightness <= 0.483, lightness * 0.9 + 0.3, lightness * 0.75 - 0.15)
+    return rgb_to_srgb(oklab_to_rgb(oklab))
+
+
+def palette_colors(colors: list[Color]) -> tuple[NDArray, NDArray]:
+    """
+    Converts the bar and text colors of the whole palette at once, instead of once per tile
+
+    :param colors: The colors of the tiles
+    :return:       The bar and text colors in sRGB, (N, 3) each, in the same order as the tiles
+    """
+    oklab = rgb_to_oklab(np.array([c.rgb for c in colors], dtype=float).reshape(-1, 3))
+    return bar_colors(oklab), text_colors(oklab)
+
+
 def bar_color(c: Color) -> Color:
-    return Color(
-        (
-            c.Oklab[0] * 0.9,
-            c.Oklab[1],
-            c.Oklab[2]
-        ),
-        model='oklab',
-        alpha=c.alpha
-    )
+    return Color.from_array(bar_colors(c.oklab), model='srgb', alpha=c.alpha)
 
 
 def text_color(c: Color) -> Color:
-    return Color(
-        (
-            c.Oklab[0] * 0.9 + 0.3
-            if c.dark
-            else c.Oklab[0] * 0.75 - 0.15,
-            c.Oklab[1],
-            c.Oklab[2]
-        ),
-        model='oklab',
-        alpha=c.alpha
-    )
+    return Color.from_array(text_colors(c.oklab), model='srgb', alpha=c.alpha)
 
 
 class Previewer:
     """
     Wrapper for formats, simply returns the appropriate previewer based on chosen mode
     """
-    def __new__(cls, palette: u1 | u2, show: bool = True, save: bool = False, output: image_format = 'png'):
+    def __new__(
+        cls,
+        palette: u1 | u2,
+        show: bool = True,
+        save: bool = False,
+        output: image_format = 'png',
+        workers: int | None = 1,
+        cache: RenderCache | bool = False
+    ):
+        if output in ('png', 'webp'):
+            return PNGPreviewer(palette, show, save, workers, cache, output == 'webp')
+        if output in ('svg', 'svgz'):
+            return SVGPreviewer(palette, show, save, cache, output == 'svgz')
+        raise ValueError(f'Invalid previewer mode: <{output}>')
+
+
+def render_many(
+    palettes: Iterable[u1 | u2],
+    output: image_format = 'png',
+    workers: int | None = None,
+    cache: RenderCache | bool = False
+) -> list[Image.Image | ElementTree.ElementTree]:
+    """
+    Renders many palettes in a pool of threads, nothing is shown or saved
+    Renders share no state but caches, so this can itself be called from several threads
+
+    :param palettes: The palettes to render
+    :param output:   The image format to render
+    :param workers:  Threads to render in, None for the default of ThreadPoolExecutor
+    :param cache:    The render cache to use, see Previewer
+    :return:         The images, in the order of the palettes
+    """
+    if output not in ('png', 'svg', 'svgz', 'webp'):
+        raise ValueError(f'Invalid previewer mode: <{output}>')
+    with ThreadPoolExecutor(workers) as pool:
+        return list(pool.map(lambda p: Previewer(p, show=False, save=False, output=output, cache=cache), palettes))
+
+
+def render_bytes(
+    palette: u1 | u2,
+    output: image_format = 'png',
+    workers: int | None = 1,
+    cache: RenderCache | bool = False
+) -> bytes:
+    """
+    Renders a palette into the contents of an image file, nothing is shown or written to disk but the cache
+
+    :param palette: The palette of colors to generate an image for
+    :param output:  The image format to render
+    :param workers: Processes to draw a png in, see Previewer
+    :param cache:   The render cache to use, see Previewer
+    :return:        The png, svg, svgz or webp file, with the same metadata as a saved preview
+    """
+    if output not in ('png', 'svg', 'svgz', 'webp'):
+        raise ValueError(f'Invalid previewer mode: <{output}>')
+    return _render_bytes(Palette(palette), output, workers, cache)
+
+
+def render_stream(palette: u1 | u2, output: image_format = 'png') -> Iterator[bytes]:
+    """
+    Renders a palette into the contents of an image file in parts, for palettes too big to hold as one image
+    A png is drawn a row of tiles at a time, its pixels and metadata are the same as a saved preview
+    WebP cannot be written in parts, it is rendered whole and given as one part
+
+    :param palette: The palette of colors to generate an image for
+    :param output:  The image format to render
+    :return:        The file in parts, to write to a file or send as they come
+    """
+    if output not in ('png', 'svg', 'svgz', 'webp'):
+        raise ValueError(f'Invalid previewer mode: <{output}>')
+    p = Palette(palette)
+    if output == 'png':
+        return PNGPreviewer._stream(p)
+    if output == 'webp':
+        return iter([_render_bytes(p, output, 1, False)])
+    svg = (i.encode('utf-8') for i in SVGPreviewer._write(p))
+    return _gzip(svg) if output == 'svgz' else svg
+
+
+def _png_chunk(cid: bytes, data: bytes) -> bytes:
+    """
+    :param cid:  The type of the chunk
+    :param data: The contents of the chunk
+    :return:     The chunk as written in the file, with its length and checksum
+    """
+    return pack('>I', len(data)) + cid + data + pack('>I', crc32(cid + data))
+
+
+def _gzip(parts: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    :param parts: The file in parts
+    :return:      The file compressed as svgz is, in parts
+    """
+    # the gzip header zlib writes has no name or time, so the same file always compresses the same
+    z = compressobj(9, wbits=31)
+    for i in parts:
+        if data := z.compress(i):
+            yield data
+    yield z.flush()
+
+
+# the most a channel of an antialiased pixel may change when a small png is indexed, out of 255
+_quantize_error = 8
+
+# bump whenever the drawing changes, so that cached renders of older versions are not used
+_cache_version = 2
+
+
+@lru_cache(maxsize=1)
+def _libraries() -> list[str | None]:
+    """
+    :return: Versions of the libraries that the output depends on, None for those not installed
+    """
+    ret = []
+    for i in ('pillow', 'drawsvg', 'fonttools', 'brotli'):
         try:
-            return {'png': PNGPreviewer, 'svg': SVGPreviewer}[output](palette, show, save)
-        except KeyError:
-            raise ValueError(f'Invalid previewer mode: <{output}>')
+            ret.append(version(i))
+        except PackageNotFoundError:
+            ret.append(None)
+    return ret
+
+
+def _cache_key(p: Palette, output: image_format) -> str:
+    """
+    Hashes everything the output depends on, without converting any color
+
+    :param p:      The palette to render
+    :param output: The image format to render
+    :return:       The hash of the render
+    """
+    s = p.settings
+    font = PNGPreviewer._get_font(s) if output in ('png', 'webp') else local_font(s.font_name, s.font_opts)
+    # local font files are keyed by their state as well, like the font css
+    font = [font, getmtime(font), getsize(font)] if font is not None and isfile(font) else font
+    # each color by the value it was created from, which decides all of its other models
+    colors = [[c.original, c._model(c.original), c.alpha, c.name, c.desc_left, c.desc_right] for c in p.colors]
+    key = [_cache_version, _libraries(), output, s.serialize(), font, p.width, p.height, colors]
+    return sha256(dumps(key, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _render_bytes(p: Palette, output: image_format, workers: int | None, cache: RenderCache | bool) -> bytes:
+    """
+    :param p:       The palette to render
+    :param output:  The image format to render
+    :param workers: Processes to draw a png in, see Previewer
+    :param cache:   The render cache to use, see Previewer
+    :return:        The png, svg, svgz or webp file, from the cache if it has it
+    """
+    if cache:
+        cache = render_cache if cache is True else cache
+        key = _cache_key(p, output)
+        if (data := cache.get(key, output)) is not None:
+            return data
+    if output in ('png', 'webp'):
+        img, _, _, _ = PNGPreviewer._render(p, workers)
+        with BytesIO() as f:
+            PNGPreviewer._save(img, f, p.settings, output)
+            data = f.getvalue()
+    else:
+        data = ''.join(SVGPreviewer._write(p)).encode('utf-8')
+        if output == 'svgz':
+            data = b''.join(_gzip([data]))
+    if cache:
+        cache.put(key, output, data)
+    return data
 
 
 class PNGPreviewer:
     @classmethod
     def _get_font(cls, s: Settings) -> str:
         if s.font_name == 'Nunito':
-            font = dirname(getabsfile(currentframe())) + '/nunito.ttf'
+            font = bundled
         else:
             font = s.font_name + '.ttf'
         return font
@@ -67,7 +329,7 @@ class PNGPreviewer:
     def _get_hex_word(cls, col: Color, s: Settings) -> str:
         hx = col.hexadecimal
         if col.alpha < 1:
-            hx += f'{col.alpha:2X}'
+            hx += f'{round(col.alpha * 255):02x}'
         if not s.show_hash:
             hx = hx[1:]
         if s.hex_upper:
@@ -75,137 +337,640 @@ class PNGPreviewer:
         return hx
 
     @classmethod
-    def _draw_bg(cls, draw: ImageDraw.Draw, pos: Distance, size: Distance, col: Color, s: Settings):
+    def _layer_table(cls, colors: list[Color], bar: NDArray) -> NDArray:
+        """
+        The components are truncated and clipped like PIL does
+
+        :param colors: The colors of the tiles
+        :param bar:    Colors of the bars in sRGB, in the same order as the tiles
+        :return:       The background and bar color of every tile as RGBA, (N, 2, 4), empty tiles stay transparent
+        """
+        alpha = np.array([c.alpha for c in colors], dtype=float).reshape(-1, 1)
+        srgb = np.array([c.srgb for c in colors], dtype=float).reshape(-1, 3)
+        rgba = np.stack((np.hstack((srgb, alpha)), np.hstack((bar, alpha))), axis=1)
+        visible = alpha[:, 0] >= 0.005
+        table = np.zeros((len(colors), 2, 4), dtype=np.uint8)
+        table[visible] = np.clip(np.trunc(rgba[visible] * 255), 0, 255)
+        return table
+
+    @classmethod
+    def _layer_rows(cls, s: Settings) -> NDArray:
+        """
+        The bar covers the last bar_height + 1 rows of a tile, the background covers the rest
+
+        :param s: The settings of the palette
+        :return:  For every pixel row of a tile, 0 for the background and 1 for the bar
+        """
+        return (np.arange(s.grid_height) >= s.grid_height - 1 - s.bar_height).astype(np.intp)
+
+    @classmethod
+    def _draw_layer(cls, p: Palette, bar: NDArray) -> NDArray:
+        """
+        Rasterizes the backgrounds and bars of all tiles at once, the text is drawn over it afterwards
+        Gives the same pixels as two rectangles per tile
+        Tiles are a single column wide, stretching them to their width is left to PIL
+
+        :param p:   The palette to draw
+        :param bar: Colors of the bars in sRGB, in the same order as the tiles
+        :return:    The layer as an RGBA array, one row per pixel and one column per tile
+        """
+        s = p.settings
+        table = np.zeros((p.height * p.width, 2, 4), dtype=np.uint8)
+        table[:len(p.colors)] = cls._layer_table(p.colors, bar)
+        layer = table.reshape(p.height, p.width, 2, 4)[:, :, cls._layer_rows(s)].transpose(0, 2, 1, 3)
+        return np.ascontiguousarray(layer).reshape(p.height * s.grid_height, p.width, 4)
+
+    @classmethod
+    def _draw_text(
+        cls,
+        draw: ImageDraw.Draw,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        xy: tuple[float, float],
+        text: str,
+        font: ImageFont.FreeTypeFont,
+        fill: tuple[int, ...],
+        anchor: str
+    ) -> list[tuple[int, int, int, int]]:
+        """
+        :return: The bounding box of the text if it reaches outside its tile, otherwise nothing
+        """
+        if '\n' in text:
+            draw.text(xy, text, font=font, fill=fill, anchor=anchor)
+        else:
+            # what draw.text does, but with the mask rasterized once for every tile with the same text
+            # PIL blends it in, so the pixels are the same
+            (x, fx), (y, fy) = (int(xy[0]), modf(xy[0])[0]), (int(xy[1]), modf(xy[1])[0])
+            mask, (ox, oy) = _sprite(font, text, anchor, (fx, fy))
+            draw.draw.draw_bitmap((x + ox, y + oy), mask, draw.draw.draw_ink(fill))
+        # an estimate from the advance of each character is enough to rule out almost every text
+        # only the rest is measured, which costs about as much as drawing it
+        pad = font.size / 4
+        width = sum(_advance(font, i) for i in text) + 2 * pad
+        height = sum(font.getmetrics()) + 2 * pad
+        x = {'l': xy[0] - pad, 'm': xy[0] - width / 2, 'r': xy[0] - width + pad}[anchor[0]]
+        y = {'t': xy[1] - pad, 'm': xy[1] - height / 2}[anchor[1]]
         l, p = pos
         w, h = size
-        bg_col = tuple([int(x * 255) for x in col.srgb] + [int(col.alpha * 255)])
-        bar_col = tuple([int(x * 255) for x in bar_color(col).srgb] + [int(col.alpha * 255)])
-        draw.rectangle(
-            (
-                (l, p),
-                (l + w, p + h - s.bar_height - 1)
-            ),
-            fill=bg_col
-        )
-        draw.rectangle(
-            (
-                (l, p + h - s.bar_height),
-                (l + w, p + h)
-            ),
-            fill=bar_col
+        if l <= x and x + width <= l + w + 1 and p <= y and y + height <= p + h + 1:
+            return []
+        return [draw.textbbox(xy, text, font=font, anchor=anchor)]
+
+    @classmethod
+    def _restore(
+        cls,
+        img: Image.Image,
+        layer: NDArray,
+        p: Palette,
+        i: int,
+        box: tuple[int, int, int, int],
+        origin: tuple[int, int] = (0, 0)
+    ):
+        """
+        When drawing tile by tile, the backgrounds of the following tiles covered any text reaching into them
+        Paints those backgrounds over the text again, to keep the same result
+
+        :param img:    The image being drawn, the whole palette or a part of it
+        :param layer:  The backgrounds and bars, from _draw_layer
+        :param p:      The palette being drawn
+        :param i:      Index of the tile whose text is outside it
+        :param box:    Bounding box of that text, in the coordinates of img
+        :param origin: Position of the top left corner of img in the palette
+        """
+        gw, gh = p.settings.grid_width, p.settings.grid_height
+        ox, oy = origin
+        # one pixel of margin for antialiasing, in the coordinates of the palette so that parts round the same
+        x0, y0 = max(ox, int(box[0] + ox) - 1), max(oy, int(box[1] + oy) - 1)
+        x1, y1 = min(ox + img.width, int(box[2] + ox) + 2), min(oy + img.height, int(box[3] + oy) + 2)
+        for r in range(y0 // gh, (y1 - 1) // gh + 1):
+            for c in range(x0 // gw, (x1 - 1) // gw + 1):
+                o = r * p.width + c
+                if o <= i or o >= len(p.colors) or p.colors[o].alpha < 0.005:
+                    continue
+                cx0, cy0 = max(x0, c * gw), max(y0, r * gh)
+                cx1, cy1 = min(x1, (c + 1) * gw), min(y1, (r + 1) * gh)
+                img.paste(Image.fromarray(np.repeat(layer[cy0:cy1, c:c + 1], cx1 - cx0, axis=1)), (cx0 - ox, cy0 - oy))
+
+    @classmethod
+    def _draw_texts(
+        cls,
+        img: Image.Image,
+        layer: NDArray,
+        p: Palette,
+        text: list[list[float]],
+        indices: Sequence[int],
+        origin: tuple[int, int] = (0, 0)
+    ) -> dict[int, list[tuple[int, int, int, int]]]:
+        """
+        Draws the texts of tiles in the order given, as drawing the whole palette tile by tile would
+
+        :param img:     The image to draw on, the whole palette or a part of it
+        :param layer:   The backgrounds and bars, from _draw_layer
+        :param p:       The palette being drawn
+        :param text:    Text colors in sRGB, in the same order as the tiles
+        :param indices: Indices of the tiles to draw, ascending
+        :param origin:  Position of the top left corner of img in the palette
+        :return:        Bounding boxes in the palette of the texts that reach outside their tile, by tile index
+        """
+        s = p.settings
+        ox, oy = origin
+        draw = ImageDraw.Draw(img, 'RGBA')
+        ret = {}
+        for i, (x, y, w, h) in zip(indices, p.layout[np.asarray(indices, dtype=np.intp)].tolist()):
+            col = p.colors[i]
+            if col.alpha < 0.005:
+                continue
+            spills = cls._draw_text_name(draw, (x - ox, y - oy), (w, h), col, s, text[i])
+            spills += cls._draw_text_desc(draw, (x - ox, y - oy), (w, h), col, s, text[i])
+            for box in spills:
+                cls._restore(img, layer, p, i, box, origin)
+            if spills:
+                ret[i] = [(b[0] + ox, b[1] + oy, b[2] + ox, b[3] + oy) for b in spills]
+        return ret
+
+    @classmethod
+    def _cells(cls, p: Palette, box: tuple[int, int, int, int]) -> tuple[int, int, int, int]:
+        """
+        :param p:   The palette being drawn
+        :param box: A bounding box of text in the palette
+        :return:    The rows and columns of the tiles it reaches, with the margin _restore uses, end exclusive
+                    empty when the text is wholly outside the palette
+        """
+        gw, gh = p.settings.grid_width, p.settings.grid_height
+        x0, y0, x1, y1 = int(box[0]) - 1, int(box[1]) - 1, int(box[2]) + 2, int(box[3]) + 2
+        return (
+            max(0, y0 // gh),
+            max(0, x0 // gw),
+            min(p.height, (y1 - 1) // gh + 1),
+            min(p.width, (x1 - 1) // gw + 1)
         )
 
     @classmethod
-    def _draw_text_name(cls, draw: ImageDraw.Draw, pos: Distance, size: Distance, col: Color, s: Settings):
+    def _margin(cls, s: Settings) -> int:
+        """
+        PIL places text by the fraction of its position, which changes sign with the position
+        so a part of the palette is drawn starting before every text that starts inside the palette
+        texts start at most a font size before their bounding box
+
+        :param s: The settings of the palette
+        :return:  How far before the texts to start drawing
+        """
+        return max(s.name_size, s.hex_size, s.hex_size_nameless, s.desc_size)
+
+    @classmethod
+    def _origin(
+        cls,
+        p: Palette,
+        spills: dict[int, list[tuple[int, int, int, int]]],
+        region: tuple[int, int, int, int],
+        indices: list[int]
+    ) -> tuple[int, int]:
+        """
+        :param p:       The palette being drawn
+        :param spills:  The bounding boxes of texts outside their tile, by tile index
+        :param region:  The block of tiles to draw
+        :param indices: The tiles whose texts are drawn
+        :return:        Where to start drawing the block
+        """
+        gw, gh = p.settings.grid_width, p.settings.grid_height
+        margin = cls._margin(p.settings)
+        boxes = [b for i in indices for b in spills.get(i, [])]
+        # there may be no tiles to draw and no texts inside the palette, then the block starts at itself
+        x = min((*(i % p.width * gw for i in indices), *(b[0] for b in boxes if b[0] >= 0)), default=region[1] * gw)
+        y = min((*(i // p.width * gh for i in indices), *(b[1] for b in boxes if b[1] >= 0)), default=region[0] * gh)
+        return max(0, int(min(x, region[1] * gw)) - margin), max(0, int(min(y, region[0] * gh)) - margin)
+
+    @classmethod
+    def _redraw(
+        cls,
+        img: Image.Image,
+        layer: NDArray,
+        p: Palette,
+        text: list[list[float]],
+        spills: dict[int, list[tuple[int, int, int, int]]],
+        region: tuple[int, int, int, int]
+    ):
+        """
+        Draws a block of tiles again, with every text that reaches into it, then puts it into the image
+        The block ends up as drawing the whole palette would leave it
+
+        :param img:    The image of the whole palette
+        :param layer:  The backgrounds and bars, from _draw_layer
+        :param p:      The palette being drawn
+        :param text:   Text colors in sRGB, in the same order as the tiles
+        :param spills: The bounding boxes of texts outside their tile, updated for the tiles drawn
+        :param region: The first row and column and the end row and column of the block
+        """
+        gw, gh = p.settings.grid_width, p.settings.grid_height
+        r0, c0, r1, c1 = region
+        # a text wholly outside the palette reaches no tile
+        if r0 >= r1 or c0 >= c1:
+            return
+        indices = {r * p.width + c for r in range(r0, r1) for c in range(c0, c1)}
+        for j, boxes in spills.items():
+            for b in boxes:
+                br0, bc0, br1, bc1 = cls._cells(p, b)
+                if br0 < r1 and r0 < br1 and bc0 < c1 and c0 < bc1:
+                    indices.add(j)
+                    break
+        indices = sorted(i for i in indices if i < len(p.colors))
+        origin = None
+        # the texts of changed tiles are only known after drawing them, if they start earlier it is drawn again
+        while origin != (origin := cls._origin(p, spills, region, indices)):
+            x0, y0 = origin
+            crop = Image.fromarray(np.repeat(layer[y0:r1 * gh, x0 // gw:c1], gw, axis=1)[:, x0 % gw:])
+            drawn = cls._draw_texts(crop, layer, p, text, indices, origin)
+            for j in indices:
+                spills.pop(j, None)
+            spills.update(drawn)
+        img.paste(crop.crop((c0 * gw - x0, r0 * gh - y0, crop.width, crop.height)), (c0 * gw, r0 * gh))
+
+    @classmethod
+    def _draw_text_name(
+        cls,
+        draw: ImageDraw.Draw,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        col: Color,
+        s: Settings,
+        text_srgb: list[float]
+    ) -> list[tuple[int, int, int, int]]:
         l, p = pos
         w, h = size
         font = cls._get_font(s)
         hx = cls._get_hex_word(col, s)
-        text_col = tuple([int(x * 255) for x in text_color(col).srgb] + [int(col.alpha * 255)])
+        text_col = tuple([int(x * 255) for x in text_srgb] + [int(col.alpha * 255)])
+        spills = []
         if col.name:
-            draw.text(
+            spills += cls._draw_text(
+                draw,
+                pos,
+                size,
                 (l + w / 2, p + h / 2 + s.name_offset),
                 col.name,
-                font=ImageFont.truetype(font, size=s.name_size),
-                fill=text_col,
-                anchor='mm'
+                load_font(font, s.name_size),
+                text_col,
+                'mm'
             )
-            draw.text(
+            spills += cls._draw_text(
+                draw,
+                pos,
+                size,
                 (l + w / 2, p + h / 2 + s.hex_offset),
                 hx,
-                font=ImageFont.truetype(font, size=s.hex_size),
-                fill=text_col,
-                anchor='mm'
+                load_font(font, s.hex_size),
+                text_col,
+                'mm'
             )
         else:
-            draw.text(
+            spills += cls._draw_text(
+                draw,
+                pos,
+                size,
                 (l + w / 2, p + h / 2 + s.hex_offset_nameless),
                 hx,
-                font=ImageFont.truetype(font, size=s.hex_size_nameless),
-                fill=text_col,
-                anchor='mm'
+                load_font(font, s.hex_size_nameless),
+                text_col,
+                'mm'
             )
+        return spills
 
     @classmethod
-    def _draw_text_desc(cls, draw: ImageDraw.Draw, pos: Distance, size: Distance, col: Color, s: Settings):
+    def _draw_text_desc(
+        cls,
+        draw: ImageDraw.Draw,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        col: Color,
+        s: Settings,
+        text_srgb: list[float]
+    ) -> list[tuple[int, int, int, int]]:
         l, p = pos
         w, _ = size
         font = cls._get_font(s)
-        text_col = tuple([int(x * 255) for x in text_color(col).srgb] + [int(col.alpha * 255)])
+        text_col = tuple([int(x * 255) for x in text_srgb] + [int(col.alpha * 255)])
+        spills = []
         if col.desc_left:
-            draw.text(
+            spills += cls._draw_text(
+                draw,
+                pos,
+                size,
                 (l + s.desc_offset_x, p + s.desc_offset_y),
                 col.desc_left,
-                font=ImageFont.truetype(font, size=s.desc_size),
-                fill=text_col,
-                anchor='lt'
+                load_font(font, s.desc_size),
+                text_col,
+                'lt'
             )
         if col.desc_right:
-            draw.text(
+            spills += cls._draw_text(
+                draw,
+                pos,
+                size,
                 (l + w - 1 - s.desc_offset_x, p + s.desc_offset_y),
                 col.desc_right,
-                font=ImageFont.truetype(font, size=s.desc_size),
-                fill=text_col,
-                anchor='rt'
+                load_font(font, s.desc_size),
+                text_col,
+                'rt'
+            )
+        return spills
+
+    @classmethod
+    def _draw_band(
+        cls,
+        p: Palette,
+        layer: NDArray,
+        text: list[list[float]],
+        rows: tuple[int, int],
+        out: str
+    ) -> dict[int, list[tuple[int, int, int, int]]]:
+        """
+        Draws a band of rows on its own, in a worker process
+        Texts reaching outside the band are missing or cut off, they are drawn again once the bands are joined
+
+        :param p:     The palette being drawn
+        :param layer: The backgrounds and bars, from _draw_layer
+        :param text:  Text colors in sRGB, in the same order as the tiles
+        :param rows:  The first and the end row of the band
+        :param out:   Name of the shared memory of the whole image, the band is written into it
+        :return:      The bounding boxes of the texts of the band that reach outside their tile
+        """
+        r0, r1 = rows
+        gh = p.settings.grid_height
+        # starting before the band, so that the texts inside it are placed as in the whole palette
+        y0 = max(0, r0 * gh - cls._margin(p.settings))
+        img = Image.fromarray(layer[y0:r1 * gh]).resize((p.size.x, r1 * gh - y0), Image.Resampling.NEAREST)
+        spills = cls._draw_texts(img, layer, p, text, range(r0 * p.width, min(r1 * p.width, len(p.colors))), (0, y0))
+        shm = SharedMemory(out)
+        np.ndarray((p.size.y, p.size.x, 4), np.uint8, shm.buf)[r0 * gh:r1 * gh] = np.asarray(img)[r0 * gh - y0:]
+        shm.close()
+        return spills
+
+    @classmethod
+    def _render(cls, p: Palette, workers: int | None = 1) -> tuple[Image.Image, NDArray, list[list[float]], dict]:
+        """
+        :param p:       The palette to draw
+        :param workers: Processes to draw bands of rows in, None for one per core
+        :return:        The image, the layer of backgrounds and bars, the text colors
+                        and the bounding boxes of the texts that reach outside their tile
+        """
+        bar, text = palette_colors(p.colors)
+        text = text.tolist()
+        layer = cls._draw_layer(p, bar)
+        workers = min(workers or cpu_count() or 1, p.height)
+        if workers == 1:
+            # stretching with nearest neighbour by a whole factor only repeats the columns
+            img = Image.fromarray(layer).resize(tuple[int, int](p.size), Image.Resampling.NEAREST)
+            spills = cls._draw_texts(img, layer, p, text, range(len(p.colors)))
+            cls._set_meta(img, p)
+            return img, layer, text, spills
+        bands = [(int(b[0]), int(b[-1]) + 1) for b in np.array_split(np.arange(p.height), workers)]
+        # the bands are written into shared memory, sending the pixels back would take as long as a band takes to draw
+        shm = SharedMemory(create=True, size=p.size.x * p.size.y * 4)
+        try:
+            # each worker loads the fonts it needs once, into its own cache
+            with ProcessPoolExecutor(workers) as pool:
+                parts = list(pool.map(cls._draw_band, repeat(p), repeat(layer), repeat(text), bands, repeat(shm.name)))
+            img = Image.fromarray(np.ndarray((p.size.y, p.size.x, 4), np.uint8, shm.buf).copy())
+        finally:
+            shm.close()
+            shm.unlink()
+        spills = {}
+        regions = set()
+        for (r0, r1), band in zip(bands, parts):
+            spills.update(band)
+            # texts wholly outside the image reach no tile, there is nothing to draw again for them
+            regions.update(
+                cells for boxes in band.values() for b in boxes
+                if (cells := cls._cells(p, b))[0] < cells[2] and cells[1] < cells[3]
+                and (cells[0] < r0 or cells[2] > r1)
             )
+        # only the tiles around texts that cross the edge of a band are drawn again, in order
+        for region in sorted(regions):
+            cls._redraw(img, layer, p, text, spills, region)
+        cls._set_meta(img, p)
+        return img, layer, text, spills
 
-    def __new__(cls, palette: u1 | u2, show: bool = True, save: bool = False) -> Image.Image:
+    @classmethod
+    def _meta(cls, p: Palette) -> dict[str, str]:
+        # the whole palette in the metadata, so that reversing does not need the pixels
+        # large palettes continue in numbered chunks, Pillow would not open the file with them in one
+        data = p.serialize()
+        return {'colorGen': p.settings.serialize()} | {
+            f'colorGenPalette{i // _palette_chunk or ""}': data[i:i + _palette_chunk]
+            for i in range(0, max(1, len(data)), _palette_chunk)
+        }
+
+    @classmethod
+    def _set_meta(cls, img: Image.Image, p: Palette):
+        img.text = cls._meta(p)
+
+    @classmethod
+    def _pnginfo(cls, text: dict[str, str]) -> PngInfo:
+        # despite setting the text dict, we need to explicitly write it as a PngInfo
+        meta = PngInfo()
+        # in a fixed order, so that the same palette is always the same file
+        for k in ('colorGen', *_palette_keys(text)):
+            meta.add_text(k, text[k], zip=k != 'colorGen')
+        return meta
+
+    @classmethod
+    def _xmp(cls, text: dict[str, str]) -> bytes:
+        """
+        WebP has no text chunks, the metadata is kept as XMP in the namespace of this library
+
+        :param text: The metadata of the image
+        :return:     The XMP packet
+        """
+        fields = ''.join(f'<prev_gen:{k}>{escape(text[k])}</prev_gen:{k}>' for k in ('colorGen', *_palette_keys(text)))
+        return (
+            '<?xpacket begin="\ufeff" id="W5M0MpCehiHzreSzNTczkc9d"?>'
+            '<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">'
+            f'<rdf:Description rdf:about="" xmlns:prev_gen="{_xmp_namespace}">{fields}</rdf:Description>'
+            '</rdf:RDF></x:xmpmeta><?xpacket end="r"?>'
+        ).encode('utf-8')
+
+    @classmethod
+    def _level(cls, s: Settings) -> int:
+        """
+        :param s: The settings of the palette
+        :return:  The zlib level of its encoding profile
+        """
+        try:
+            return {'fast': 1, 'default': 6, 'small': 9}[s.profile]
+        except KeyError:
+            raise ValueError(f'Invalid encoding profile: <{s.profile}>')
+
+    @classmethod
+    def _quantize(cls, img: Image.Image, s: Settings) -> Image.Image:
+        """
+        Indexes the colors when that is lossless enough
+        Every flat area keeps its exact color, the edges of the texts may move by at most _quantize_error in any channel
+
+        :param img: The drawn image
+        :param s:   The settings of the palette
+        :return:    The image in mode P, or as it was if 256 colors cannot hold it
+        """
+        pixels = np.asarray(img).view(np.uint32).ravel()
+        colors, index, counts = np.unique(pixels, return_inverse=True, return_counts=True)
+        # a color that covers as much as a bar is a flat area, the backgrounds, the bars and the insides of the texts
+        flat = np.flatnonzero(counts >= s.grid_width * max(1, s.bar_height))
+        if len(flat) > 256:
+            return img
+        rgba = colors.view(np.uint8).reshape(-1, 4).astype(np.int16)
+        chosen = []
+        nearest = np.zeros(len(colors), dtype=np.uint8)
+        error = np.full(len(colors), 256, dtype=np.int16)
+        # then the color farthest from the palette so far, until it is full, which keeps the largest error small
+        for i in (*flat.tolist(), *repeat(None, 256 - len(flat))):
+            i = int(error.argmax()) if i is None else i
+            if error[i] == 0:
+                break
+            d = np.abs(rgba - rgba[i]).max(axis=1)
+            closer = d < error
+            error[closer] = d[closer]
+            nearest[closer] = len(chosen)
+            chosen.append(i)
+        if error.max() > _quantize_error:
+            return img
+        palette = rgba[chosen].astype(np.uint8)
+        ret = Image.frombytes('P', img.size, nearest[index].tobytes())
+        opaque = (palette[:, 3] == 255).all()
+        ret.putpalette(palette[:, :3 if opaque else 4].tobytes(), 'RGB' if opaque else 'RGBA')
+        return ret
+
+    @classmethod
+    def _save(cls, img: Image.Image, fp: str | BinaryIO, s: Settings, output: image_format = 'png'):
+        """
+        :param img:    The drawn image, with its metadata in text
+        :param fp:     The filename or binary file object to write to
+        :param s:      The settings of the palette, with the encoding profile
+        :param output: The file format, png or webp
+        """
+        level = cls._level(s)
+        if output == 'webp':
+            # lossless at every profile, only the effort spent compressing changes
+            # exact keeps the color of transparent pixels, which the encoder would otherwise change
+            opts = {1: {'method': 1, 'quality': 0}, 6: {}, 9: {'method': 6, 'quality': 100}}[level]
+            img.save(fp, 'WEBP', lossless=True, exact=True, xmp=cls._xmp(img.text), **opts)
+        elif s.profile == 'small':
+            cls._quantize(img, s).save(fp, 'PNG', pnginfo=cls._pnginfo(img.text), optimize=True)
+        else:
+            img.save(fp, 'PNG', pnginfo=cls._pnginfo(img.text), compress_level=level)
+
+    @classmethod
+    def _reach(cls, s: Settings) -> int:
+        """
+        How far the texts of a tile can reach outside it vertically, by the estimate _draw_text rules spills out with
+        and with the margin _restore paints around them
+
+        :param s: The settings of the palette
+        :return:  The distance in pixels, 0 if every text stays inside its tile
+        """
+        font = cls._get_font(s)
+        middle = s.grid_height / 2
+        top, bottom = [], []
+        for y, size, anchor in (
+            (middle + s.name_offset, s.name_size, 'm'),
+            (middle + s.hex_offset, s.hex_size, 'm'),
+            (middle + s.hex_offset_nameless, s.hex_size_nameless, 'm'),
+            (s.desc_offset_y, s.desc_size, 't')
+        ):
+            pad = size / 4
+            height = sum(load_font(font, size).getmetrics()) + 2 * pad
+            top.append(y - height / 2 if anchor == 'm' else y - pad)
+            bottom.append(top[-1] + height)
+        return max(0, 1 - floor(min(top)), ceil(max(bottom)) + 2 - s.grid_height)
+
+    @classmethod
+    def _stream(cls, p: Palette) -> Iterator[bytes]:
+        """
+        Encodes the preview a row of tiles at a time, without ever holding the whole image
+        Each row is drawn with the rows whose texts can reach into it, so its pixels are the same as in the whole image
+
+        The zlib level follows the encoding profile, but the colors are never indexed, that needs the whole image
+
+        :param p: The palette to draw
+        :return:  The png file in parts, with the same pixels and metadata as a saved preview
+        """
+        s = p.settings
+        gh = s.grid_height
+        bar, text = palette_colors(p.colors)
+        text = text.tolist()
+        layer = cls._draw_layer(p, bar)
+        reach = cls._reach(s)
+        rows = -(-reach // gh)
+        yield _png_signature
+        yield _png_chunk(b'IHDR', pack('>IIBBBBB', p.size.x, p.size.y, 8, 6, 0, 0, 0))
+        for cid, data, _ in cls._pnginfo(cls._meta(p)).chunks:
+            yield _png_chunk(cid, data)
+        z = compressobj(cls._level(s))
+        last = np.zeros((1, p.size.x, 4), dtype=np.uint8)
+        for r in range(p.height):
+            r0, r1 = max(0, r - rows), min(p.height, r + rows + 1)
+            # starting before the texts, so that they are placed as in the whole palette
+            y0 = max(0, r0 * gh - reach - cls._margin(s))
+            img = Image.fromarray(layer[y0:r1 * gh]).resize((p.size.x, r1 * gh - y0), Image.Resampling.NEAREST)
+            cls._draw_texts(img, layer, p, text, range(r0 * p.width, min(r1 * p.width, len(p.colors))), (0, y0))
+            band = np.asarray(img)[r * gh - y0:(r + 1) * gh - y0]
+            # every line filtered by the one above it, the tiles repeat their lines so this is mostly zeros
+            lines = np.empty((gh, 1 + p.size.x * 4), dtype=np.uint8)
+            lines[:, 0] = 2
+            lines[:, 1:] = (band - np.concatenate((last, band[:-1]))).reshape(gh, -1)
+            last = band[-1:].copy()
+            if data := z.compress(lines):
+                yield _png_chunk(b'IDAT', data)
+        yield _png_chunk(b'IDAT', z.flush())
+        yield _png_chunk(b'IEND', b'')
+
+    def __new__(
+        cls,
+        palette: u1 | u2,
+        show: bool = True,
+        save: bool = False,
+        workers: int | None = 1,
+        cache: RenderCache | bool = False,
+        webp: bool = False
+    ) -> Image.Image:
         """
         :param palette: The palette of colors to generate an image for
         :param show:    Whether to display the generated image
         :param save:    Whether to save the generated palette
+        :param workers: Processes to draw bands of rows in, None for one per core, the image is the same
+        :param cache:   A RenderCache, or True for the shared one, cached renders are the same files as new ones
+        :param webp:    Whether to save it as lossless webp instead of png
         :returns:       (PIL.Image) The created image
         """
         p = Palette(palette)
         s = p.settings
-        img = Image.new('RGBA', tuple[int, int](p.size))
-        draw = ImageDraw.Draw(img, 'RGBA')
-        img.text = {'colorGen': s.serialize()}
-        for i, v in enumerate(p):
-            if v.col.alpha < 0.005:
-                continue
-            if v.col.name or v.col.desc_left or v.col.desc_right:
-                img.text[f'color{i}'] = v.col.serialize_text()
-            cls._draw_bg(draw, v.pos, v.size, v.col, s)
-            cls._draw_text_name(draw, v.pos, v.size, v.col, s)
-            cls._draw_text_desc(draw, v.pos, v.size, v.col, s)
-        # despite setting the text dict, we need to explicitly write it as a PngInfo
-        meta = PngInfo()
-        for k, v in img.text.items():
-            meta.add_text(k, v)
-        if save:
-            img.save(s.file_name + '.png', pnginfo=meta)
+        output = 'webp' if webp else 'png'
+        if cache:
+            data = _render_bytes(p, output, workers, cache)
+            img = Image.open(BytesIO(data))
+            # indexed and webp files are opened in other modes, the image is given as it was drawn
+            if img.mode != 'RGBA':
+                img = img.convert('RGBA')
+                cls._set_meta(img, p)
+            if save:
+                with open(f'{s.file_name}.{output}', 'wb') as f:
+                    f.write(data)
+        else:
+            img, _, _, _ = cls._render(p, workers)
+            if save:
+                cls._save(img, f'{s.file_name}.{output}', s, output)
         if show:
             if not save:
                 img.show()
             else:
-                open(s.file_name + '.png')
+                browse(f'{s.file_name}.{output}')
         return img
 
 
-class SVGMeta(DrawingElement):
-    """
-    For whatever reason custom elements get written twice
-    Keep track of this to return nothing the second time
-    """
-    written = False
-
-    def __init__(self, s: Settings):
-        super().__init__()
-        self.gen_s = s
-
-    def write_svg_element(self, id_map, is_duplicate, output_file, lcontext, dry_run, force_dup: bool = False):
-        if not self.written:
-            output_file.write(f'<text use="meta" display="none">{self.gen_s.serialize()}</text>')
-            self.written = True
-
-
 class SVGPreviewer:
     @classmethod
     def _get_hex_word(cls, col: Color, s: Settings) -> str:
         hx = col.hexadecimal
         if col.alpha < 1:
-            hx += f'{col.alpha:2X}'
+            hx += f'{round(col.alpha * 255):02x}'
         if not s.show_hash:
             hx = hx[1:]
         if s.hex_upper:
@@ -213,153 +978,520 @@ class SVGPreviewer:
         return hx
 
     @classmethod
-    def _draw_bg(cls, draw: Drawing, pos: Distance, size: Distance, col: Color, s: Settings):
+    def _rect(cls, x: float, y: float, width: float, height: float, **attrs) -> str:
+        """
+        :param attrs: The attributes after the size, in order, None ones are left out
+        :return:      The element as drawsvg writes a Rectangle, without building one
+        """
+        args = ''.join(f' {k.replace("_", "-")}="{v}"' for k, v in attrs.items() if v is not None)
+        return f'<rect x="{x}" y="{y}" width="{width}" height="{height}"{args} />'
+
+    @classmethod
+    def _text(cls, text: str, font_size: float, x: float, y: float, **attrs) -> str:
+        """
+        :param attrs: The attributes after the font size, in order, None ones are left out
+        :return:      The element as drawsvg writes a centered Text, without building one
+        """
+        if '\n' in text:
+            # drawsvg splits text with several lines into tspans, those are left to it
+            draw = Drawing(0, 0)
+            draw.append(Text(text, font_size, x, y, center=True, **attrs))
+            svg = draw.as_svg()
+            return svg[svg.index('</defs>\n') + 8:-len('\n</svg>')]
+        attrs.setdefault('text_anchor', 'middle')
+        attrs['dominant_baseline'] = 'central'
+        args = ''.join(f' {k.replace("_", "-")}="{v}"' for k, v in attrs.items() if v is not None)
+        return f'<text x="{x}" y="{y}" font-size="{font_size}"{args}>{escape(text)}</text>'
+
+    @classmethod
+    def _draw_bg(
+        cls,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        col: Color,
+        s: Settings,
+        bar_hex: str
+    ) -> list[str]:
         l, p = pos
         w, h = size
-        b_col = bar_color(col)
-        draw.append(Rectangle(
-            l,
-            p,
-            w + 1,
-            h - s.bar_height + 1,
-            use='bg',
-            fill=col.hexadecimal,
-            fill_opacity=col.alpha,
-            stroke=col.hexadecimal
-        ))
-        draw.append(Rectangle(
-            l,
-            p + h - s.bar_height + 1,
-            w + 1,
-            s.bar_height,
-            use='bar',
-            fill=b_col.hexadecimal,
-            fill_opacity=col.alpha,
-            stroke=b_col.hexadecimal
-        ))
+        return [
+            cls._rect(
+                l,
+                p,
+                w + 1,
+                h - s.bar_height + 1,
+                use='bg',
+                fill=col.hexadecimal,
+                fill_opacity=col.alpha,
+                stroke=col.hexadecimal
+            ),
+            cls._rect(
+                l,
+                p + h - s.bar_height + 1,
+                w + 1,
+                s.bar_height,
+                use='bar',
+                fill=bar_hex,
+                fill_opacity=col.alpha,
+                stroke=bar_hex
+            )
+        ]
 
     @classmethod
-    def _draw_text_name(cls, draw: Drawing, pos: Distance, size: Distance, col: Color, s: Settings):
+    def _draw_text_name(
+        cls,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        col: Color,
+        s: Settings,
+        text_hex: str
+    ) -> list[str]:
         l, p = pos
         w, h = size
-        t_col = text_color(col)
         hx = cls._get_hex_word(col, s)
         if col.name is not None:
-            draw.append(Text(
-                col.name,
-                use='name',
-                x=l + w / 2,
-                y=p + h / 2 + s.name_offset,
-                fill=t_col.hexadecimal,
-                fill_opacity=col.alpha,
-                center=True,
-                font_size=s.name_size,
-                font_family=s.font_name
-            ))
-            draw.append(Text(
-                hx,
-                use='hex',
-                x=l + w / 2,
-                y=p + h / 2 + s.hex_offset,
-                fill=t_col.hexadecimal,
-                fill_opacity=col.alpha,
-                center=True,
-                font_size=s.hex_size,
-                font_family=s.font_name
-            ))
-        else:
-            draw.append(Text(
-                hx,
-                use='col',
-                x=l + w / 2,
-                y=p + h / 2 + s.hex_offset_nameless,
-                fill=t_col.hexadecimal,
-                fill_opacity=col.alpha,
-                center=True,
-                font_size=s.hex_size_nameless,
-                font_family=s.font_name
-            ))
+            return [
+                cls._text(
+                    col.name,
+                    s.name_size,
+                    l + w / 2,
+                    p + h / 2 + s.name_offset,
+                    use='name',
+                    fill=text_hex,
+                    fill_opacity=col.alpha,
+                    font_family=s.font_name
+                ),
+                cls._text(
+                    hx,
+                    s.hex_size,
+                    l + w / 2,
+                    p + h / 2 + s.hex_offset,
+                    use='hex',
+                    fill=text_hex,
+                    fill_opacity=col.alpha,
+                    font_family=s.font_name
+                )
+            ]
+        return [cls._text(
+            hx,
+            s.hex_size_nameless,
+            l + w / 2,
+            p + h / 2 + s.hex_offset_nameless,
+            use='col',
+            fill=text_hex,
+            fill_opacity=col.alpha,
+            font_family=s.font_name
+        )]
 
     @classmethod
-    def _draw_text_desc(cls, draw: Drawing, pos: Distance, size: Distance, col: Color, s: Settings):
+    def _draw_text_desc(
+        cls,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        col: Color,
+        s: Settings,
+        text_hex: str
+    ) -> list[str]:
         l, p = pos
         w, _ = size
-        t_col = text_color(col)
+        ret = []
         if col.desc_left is not None:
-            draw.append(Text(
+            ret.append(cls._text(
                 col.desc_left,
+                s.desc_size,
+                l + s.desc_offset_x,
+                p + s.desc_size / 2 + s.desc_offset_y,
                 use='desc_left',
-                x=l + s.desc_offset_x,
-                y=p + s.desc_size / 2 + s.desc_offset_y,
-                center=True,
                 text_anchor='start',
-                fill=t_col.hexadecimal,
+                fill=text_hex,
                 fill_opacity=col.alpha,
-                font_size=s.desc_size,
                 font_family=s.font_name
             ))
         if col.desc_right is not None:
-            draw.append(Text(
+            ret.append(cls._text(
                 col.desc_right,
+                s.desc_size,
+                l + w - 1 - s.desc_offset_x,
+                p + s.desc_size / 2 + s.desc_offset_y,
                 use='desc_right',
-                x=l + w - 1 - s.desc_offset_x,
-                y=p + s.desc_size / 2 + s.desc_offset_y,
-                center=True,
                 text_anchor='end',
-                fill=t_col.hexadecimal,
+                fill=text_hex,
                 fill_opacity=col.alpha,
-                font_size=s.desc_size,
                 font_family=s.font_name
             ))
+        return ret
 
-    def __new__(cls, palette: u1 | u2, show: bool = True, save: bool = False) -> ElementTree.ElementTree:
+    @classmethod
+    def _draw_tile(
+        cls,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        col: Color,
+        s: Settings,
+        bar_hex: str,
+        text_hex: str
+    ) -> list[str]:
         """
-        :param palette: The palette of colors to generate an image for
-        :param show:    Whether to display the generated image
-        :param save:    Whether to save the generated palette
-        :returns:       (drawsvg.Drawing) The created image
+        :return: The elements of the tile, as drawsvg would write them
+        """
+        if col.alpha < 0.005:
+            return [cls._rect(*pos, size[0] + 1, size[1] - s.bar_height + 1, use='bg', fill_opacity=col.alpha)]
+        return (
+            cls._draw_bg(pos, size, col, s, bar_hex)
+            + cls._draw_text_name(pos, size, col, s, text_hex)
+            + cls._draw_text_desc(pos, size, col, s, text_hex)
+        )
+
+    @classmethod
+    def _number(cls, v: float, digits: int = 2) -> str:
+        """
+        :return: The number rounded, without a fraction if it is whole
+        """
+        v = round(v, digits)
+        return str(int(v)) if v == int(v) else str(v)
+
+    @classmethod
+    def _compact_css(cls, s: Settings) -> str:
+        """
+        :param s: The settings of the palette
+        :return:  The typography of each kind of text in compact drawings, as classes
+        """
+        n = cls._number
+        return (
+            'text{dominant-baseline:central;text-anchor:middle}'
+            f'.n{{font-size:{n(s.name_size)}px}}.h{{font-size:{n(s.hex_size)}px}}'
+            f'.c{{font-size:{n(s.hex_size_nameless)}px}}.l,.r{{font-size:{n(s.desc_size)}px}}'
+            '.l{text-anchor:start}.r{text-anchor:end}.e{fill:none}'
+        )
+
+    @classmethod
+    def _classes(
+        cls,
+        p: Palette,
+        bar: Sequence[str],
+        text: Sequence[str]
+    ) -> tuple[str, list[tuple[str, str, str] | None]]:
+        """
+        Each fill of the palette becomes one class, however many tiles use it, transparent tiles have none
+
+        :param p:    The palette being drawn
+        :param bar:  Colors of the bars as hex, in the same order as the tiles
+        :param text: Text colors as hex, in the same order as the tiles
+        :return:     The css of the classes, and the classes of the background, bar and texts of every tile
+        """
+        rules = {}
+        tiles = []
+        for c, b, t in zip(p.colors, bar, text):
+            if c.alpha < 0.005:
+                tiles.append(None)
+                continue
+            opacity = '' if c.alpha == 1 else f';fill-opacity:{cls._number(c.alpha, 3)}'
+            hx = c.hexadecimal
+            keys = (f'fill:{hx};stroke:{hx}{opacity}', f'fill:{b};stroke:{b}{opacity}', f'fill:{t}{opacity}')
+            tiles.append(tuple(rules.setdefault(k, f'f{len(rules):x}') for k in keys))
+        return ''.join(f'.{v}{{{k}}}' for k, v in rules.items()), tiles
+
+    @classmethod
+    def _draw_compact_tile(
+        cls,
+        pos: tuple[int, int],
+        size: tuple[int, int],
+        col: Color,
+        s: Settings,
+        classes: tuple[str, str, str] | None
+    ) -> list[str]:
+        """
+        Like _draw_tile, but the colors and typography are classes and empty texts are left out
+        Text with several lines stays in one element, it is shown on one line and reversed whole
+
+        :param classes: The classes of the background, the bar and the texts, from _classes
+        :return:        The elements of the tile
+        """
+        n = cls._number
+        l, p = pos
+        w, h = size
+        bg = f'<rect x="{l}" y="{p}" width="{n(w + 1)}" height="{n(h - s.bar_height + 1)}" use="bg"'
+        if col.alpha < 0.005:
+            return [bg + ' class="e"/>']
+        fill, bar, text = classes
+        ret = [
+            f'{bg} class="{fill}"/>',
+            f'<rect x="{l}" y="{n(p + h - s.bar_height + 1)}" width="{n(w + 1)}" height="{n(s.bar_height)}"'
+            f' class="{bar}"/>'
+        ]
+        x = n(l + w / 2)
+        if col.name is not None:
+            texts = [
+                (x, p + h / 2 + s.name_offset, 'name', 'n', col.name),
+                (x, p + h / 2 + s.hex_offset, 'hex', 'h', cls._get_hex_word(col, s))
+            ]
+        else:
+            texts = [(x, p + h / 2 + s.hex_offset_nameless, 'col', 'c', cls._get_hex_word(col, s))]
+        y = p + s.desc_size / 2 + s.desc_offset_y
+        texts += [
+            (n(l + s.desc_offset_x), y, 'desc_left', 'l', col.desc_left),
+            (n(l + w - 1 - s.desc_offset_x), y, 'desc_right', 'r', col.desc_right)
+        ]
+        for x, y, use, kind, value in texts:
+            if value:
+                ret.append(f'<text x="{x}" y="{n(y)}" use="{use}" class="{kind} {text}">{escape(value)}</text>')
+        return ret
+
+    @classmethod
+    def _tile_text(cls, col: Color, s: Settings) -> str:
+        """
+        :return: The characters displayed on a tile, which the embedded font needs
+        """
+        if col.alpha < 0.005:
+            return ''
+        return cls._get_hex_word(col, s) + col.name + col.desc_left + col.desc_right
+
+    @classmethod
+    def _css(cls, s: Settings, text: str) -> list[str]:
+        """
+        :param s:    The settings of the palette
+        :param text: The characters displayed in the whole palette
+        :return:     The css of the drawing, the font is embedded with only the glyphs that are used
         """
-        p = Palette(palette)
-        s = p.settings
-        draw = Drawing(*p.size, origin=(0, 0), id_prefix='prevgen')
-        draw.append(SVGMeta(s))
         font_opts = s.font_opts or {'wght': 700}
         if 'wght' in font_opts:
-            draw.append_css(f'text{{font-family:{s.font_name},Calibri,sans-serif;font-weight:{font_opts["wght"]};}}')
+            family = f'text{{font-family:{s.font_name},Calibri,sans-serif;font-weight:{font_opts["wght"]};}}'
         else:
-            draw.append_css(f'text{{font-family:{s.font_name},Calibri,sans-serif;}}')
-        # embed google font in svg for correct previews
-        try:
-            draw.embed_google_font(s.font_name, **font_opts)
-        except HTTPError:
-            raise ValueError(
-                f'\033[31;1mError: \'{s.font_name}\' with opts \'{font_opts}\' is not available in Google Fonts'
-            )
-        for i in p:
-            w, h = i.size
-            if i.col.alpha < 0.005:
-                draw.append(Rectangle(
-                    *i.pos,
-                    w + 1,
-                    h - s.bar_height + 1,
-                    use='bg',
-                    fill_opacity=i.col.alpha
-                ))
-                continue
-            cls._draw_bg(draw, i.pos, i.size, i.col, s)
-            cls._draw_text_name(draw, i.pos, i.size, i.col, s)
-            cls._draw_text_desc(draw, i.pos, i.size, i.col, s)
-        fn = s.file_name + '.svg' if save else 'randomFileNameThatShouldNotExistOnYourSystemYet.svg'
-        draw.save_svg(fn)
-        tree = ElementTree.parse(fn)
+            family = f'text{{font-family:{s.font_name},Calibri,sans-serif;}}'
+        return [family, font_css(s.font_name, font_opts, text)]
+
+    @classmethod
+    def _head(cls, p: Palette, css: list[str], meta: bool = True) -> str:
+        """
+        :param p:    The palette being drawn
+        :param css:  The css of the drawing, from _css
+        :param meta: Whether to write the settings, only left out for parts of a drawing
+        :return:     Everything before the first tile, as drawsvg writes a Drawing
+        """
+        w, h = p.size
+        # a cdata section ends at the first ]]>, so one is split in two like drawsvg does
+        css = '\n'.join(css).replace(']]>', ']]]]><![CDATA[>')
+        head = (
+            '<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink"\n'
+            f'     width="{w}" height="{h}" viewBox="0 0 {w} {h}">\n'
+            f'<style>/*<![CDATA[*/{css}/*]]>*/</style>\n'
+            '<defs>\n</defs>\n'
+        )
+        if meta:
+            head += f'<text use="meta" display="none">{escape(p.settings.serialize())}</text>\n'
+        return head
+
+    @classmethod
+    def _write(cls, p: Palette, counts: list[int] | None = None) -> Iterator[str]:
+        """
+        Writes the drawing a row of tiles at a time, the same as drawsvg would write it but without building it
+
+        :param p:      The palette to draw
+        :param counts: If given, the number of elements of each tile is added to it, they follow the metadata
+        :return:       The svg in parts
+        """
+        s = p.settings
+        chars = set()
+        for c in p.colors:
+            chars.update(cls._tile_text(c, s))
+        bar, text = (srgb_to_hexadecimal(x) for x in palette_colors(p.colors))
+        css = cls._css(s, ''.join(chars))
+        if s.compact:
+            rules, classes = cls._classes(p, bar, text)
+            css.append(cls._compact_css(s) + rules)
+        yield cls._head(p, css)
+        layout = p.layout.tolist()
+        for r in range(0, len(p.colors), p.width):
+            row = []
+            for j in range(r, min(r + p.width, len(p.colors))):
+                x, y, w, h = layout[j]
+                if s.compact:
+                    elements = cls._draw_compact_tile((x, y), (w, h), p.colors[j], s, classes[j])
+                else:
+                    elements = cls._draw_tile((x, y), (w, h), p.colors[j], s, bar[j], text[j])
+                if counts is not None:
+                    counts.append(len(elements))
+                row += elements
+            yield '\n'.join(row) + '\n'
+        yield '</svg>'
+
+    def __new__(
+        cls,
+        palette: u1 | u2,
+        show: bool = True,
+        save: bool = False,
+        cache: RenderCache | bool = False,
+        compress: bool = False
+    ) -> ElementTree.ElementTree:
+        """
+        :param palette:  The palette of colors to generate an image for
+        :param show:     Whether to display the generated image
+        :param save:     Whether to save the generated palette
+        :param cache:    A RenderCache, or True for the shared one, cached renders are the same files as new ones
+        :param compress: Whether to save it compressed, as svgz
+        :returns:        (xml.etree.ElementTree) The created image
+        """
+        p = Palette(palette)
+        s = p.settings
+        # rendered in memory, the disk is only touched when saving
+        if cache:
+            svg = str(_render_bytes(p, 'svg', 1, cache), 'utf-8')
+        else:
+            svg = ''.join(cls._write(p))
+        tree = ElementTree.ElementTree(ElementTree.fromstring(svg))
+        if save and compress:
+            with open(s.file_name + '.svgz', 'wb') as f:
+                f.writelines(_gzip([svg.encode('utf-8')]))
+        elif save:
+            with open(s.file_name + '.svg', 'w', encoding='utf-8') as f:
+                f.write(svg)
         if show:
-            """
-            a hacky system-agnostic way to try to open the image
-            unlike what the library name suggests, it will try to use native apps as well
-            """
-            open(fn)
-        # had to save temporarily to display in browser, remove if user did not intend to keep the file
-        if not save:
-            sleep(2)
-            remove(fn)
+            if save and not compress:
+                Thread(target=_open_file, args=(s.file_name + '.svg', False), daemon=True).start()
+            else:
+                view(svg, '.svg')
         return tree
+
+
+@dataclass(slots=True)
+class PreviewSession:
+    """
+    Keeps the last preview, so that an updated palette only redraws the tiles that changed
+    Tiles are compared by their color, transparency and texts, their positions only change with the size of the palette
+    A change of the settings or of the size redraws everything
+    The image is updated in place, copy it to keep a version
+
+    Attributes:
+        output:  The image format to render
+
+        palette: The last palette
+
+        image:   The preview of the last palette
+    """
+    output: image_format = 'png'
+    palette: Palette | None = field(default=None, init=False)
+    image: Image.Image | ElementTree.ElementTree | None = field(default=None, init=False)
+    _keys: list[tuple] = field(default_factory=list, init=False, repr=False)
+    # png, the layer of backgrounds and bars, the text colors and the texts reaching outside their tile
+    _layer: NDArray | None = field(default=None, init=False, repr=False)
+    _text: list[list[float]] | None = field(default=None, init=False, repr=False)
+    _spills: dict[int, list[tuple[int, int, int, int]]] | None = field(default=None, init=False, repr=False)
+    # svg, where the elements of the tiles are in the tree and the characters the embedded font needs
+    _start: int = field(default=0, init=False, repr=False)
+    _counts: NDArray | None = field(default=None, init=False, repr=False)
+    _texts: list[str] | None = field(default=None, init=False, repr=False)
+    _chars: Counter | None = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.output not in ('png', 'svg'):
+            raise ValueError(f'Invalid previewer mode: <{self.output}>')
+
+    @staticmethod
+    def _key(c: Color) -> tuple:
+        return tuple(c.srgb), c.alpha, c.name, c.desc_left, c.desc_right
+
+    def update(self, palette: u1 | u2) -> Image.Image | ElementTree.ElementTree:
+        """
+        :param palette: The new version of the palette
+        :return:        The preview, the same object as before unless everything was redrawn
+        """
+        p = Palette(palette)
+        keys = [self._key(c) for c in p.colors]
+        old = self.palette
+        changed = None
+        if old is not None and old.settings == p.settings and (old.width, old.height, len(old)) == (
+            p.width, p.height, len(p)
+        ):
+            changed = [i for i, (a, b) in enumerate(zip(self._keys, keys)) if a != b]
+            # past some point drawing everything at once is faster
+            if len(changed) > len(keys) // 2:
+                changed = None
+        self.palette, self._keys = p, keys
+        if changed is None:
+            self._render()
+        elif changed and self.output == 'png':
+            self._update_png(changed)
+        elif changed:
+            self._update_svg(changed)
+        return self.image
+
+    def _render(self):
+        p = self.palette
+        if self.output == 'png':
+            self.image, self._layer, self._text, self._spills = PNGPreviewer._render(p)
+            return
+        counts = []
+        root = ElementTree.fromstring(''.join(SVGPreviewer._write(p, counts)))
+        self.image = ElementTree.ElementTree(root)
+        self._counts = np.array(counts, dtype=np.intp)
+        self._start = len(root) - int(self._counts.sum())
+        self._texts = [SVGPreviewer._tile_text(c, p.settings) for c in p.colors]
+        self._chars = Counter(''.join(self._texts))
+
+    def _redraw(self, region: tuple[int, int, int, int]):
+        PNGPreviewer._redraw(self.image, self._layer, self.palette, self._text, self._spills, region)
+
+    def _update_png(self, changed: list[int]):
+        p = self.palette
+        gh = p.settings.grid_height
+        colors = [p.colors[i] for i in changed]
+        bar, text = palette_colors(colors)
+        r, c = np.divmod(np.array(changed), p.width)
+        # the layer seen as rows of tiles, each column of a tile is the same
+        tiles = self._layer.reshape(p.height, gh, p.width, 4)
+        tiles[r, :, c] = PNGPreviewer._layer_table(colors, bar)[:, PNGPreviewer._layer_rows(p.settings)]
+        for i, t in zip(changed, text.tolist()):
+            self._text[i] = t
+        # the tile and wherever its text reached before, taken first as redrawing one tile can redraw another
+        old = {
+            i: [(i // p.width, i % p.width, i // p.width + 1, i % p.width + 1)]
+            + [c for b in self._spills.get(i, []) if (c := PNGPreviewer._cells(p, b))[0] < c[2] and c[1] < c[3]]
+            for i in changed
+        }
+        for i, regions in old.items():
+            region = (
+                min(x[0] for x in regions), min(x[1] for x in regions),
+                max(x[2] for x in regions), max(x[3] for x in regions)
+            )
+            self._redraw(region)
+            # and wherever it reaches now
+            for b in self._spills.get(i, []):
+                br0, bc0, br1, bc1 = PNGPreviewer._cells(p, b)
+                if br0 < region[0] or bc0 < region[1] or br1 > region[2] or bc1 > region[3]:
+                    self._redraw((br0, bc0, br1, bc1))
+        PNGPreviewer._set_meta(self.image, p)
+
+    def _update_svg(self, changed: list[int]):
+        p = self.palette
+        s = p.settings
+        if s.compact:
+            # the classes of the colors are shared by the whole drawing, so it is written again
+            self._render()
+            return
+        root = self.image.getroot()
+        for i in changed:
+            self._chars.subtract(self._texts[i])
+            self._texts[i] = SVGPreviewer._tile_text(p.colors[i], s)
+            self._chars.update(self._texts[i])
+        # the font is embedded with the glyphs of the whole palette, so the css of a drawing of the changed tiles fits
+        css = SVGPreviewer._css(s, ''.join(k for k, v in self._chars.items() if v > 0))
+        colors = [p.colors[i] for i in changed]
+        bar, text = (srgb_to_hexadecimal(x) for x in palette_colors(colors))
+        svg = [SVGPreviewer._head(p, css, meta=False)]
+        counts = []
+        for k, (i, (x, y, w, h)) in enumerate(zip(changed, p.layout[changed].tolist())):
+            elements = SVGPreviewer._draw_tile((x, y), (w, h), p.colors[i], s, bar[k], text[k])
+            counts.append(len(elements))
+            svg += elements
+        new = ElementTree.fromstring('\n'.join(svg) + '\n</svg>')
+        style = next(e for e in new if e.tag.endswith('style'))
+        elements = [e for e in new if not e.tag.endswith(('style', 'defs'))]
+        next(e for e in root if e.tag.endswith('style')).text = style.text
+        # from the back, so that the positions of the tiles before stay valid
+        starts = (self._start + np.concatenate(([0], np.cumsum(self._counts)))).tolist()
+        ends = np.cumsum(counts).tolist()
+        for k in reversed(range(len(changed))):
+            i = changed[k]
+            root[starts[i]:starts[i + 1]] = elements[ends[k] - counts[k]:ends[k]]
+            self._counts[i] = counts[k]
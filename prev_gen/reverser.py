@@ -1,15 +1,24 @@
 from __future__ import annotations
 
-from typing import MutableSequence, Sequence
-
+from typing import BinaryIO, Iterable, Iterator, Sequence
 from xml.etree import ElementTree
+from zlib import decompressobj
+from functools import partial
+from os.path import splitext
+from itertools import chain, count, takewhile
+from io import BytesIO
+from os import SEEK_CUR
+
+from numpy.typing import NDArray
 from PIL import Image
+import numpy as np
 
+from .color_array import ColorArray
+from .palette import Palette, u2
 from .types import config_format
 from .settings import Settings
 from .config import Config
 from .color import Color
-from .palette import u2
 
 
 class Reverser:
@@ -18,170 +27,334 @@ class Reverser:
     """
     def __new__(
         cls,
-        val: ElementTree.ElementTree | Image.Image | str,
-        output: config_format | None = None
+        val: ElementTree.ElementTree | Image.Image | str | bytes | memoryview | BinaryIO,
+        output: config_format | None = None,
+        unsafe: bool = False
     ) -> u2:
+        """
+        :param val:    The image, tree, filename, contents or binary file object to reverse
+        :param output: If set, also saves the palette to reverse.<output>
+        :param unsafe: Whether to load the pickled settings of previews made by older versions
+                       only do so for files from a trusted source
+        """
         if isinstance(val, ElementTree.ElementTree):
             r = SVGReverser
         elif isinstance(val, Image.Image):
             r = PNGReverser
         elif isinstance(val, str):
-            if '.png' in val:
-                r = PNGReverser
-            elif '.svg' in val:
-                r = SVGReverser
-            else:
+            r = {'.png': PNGReverser, '.svg': SVGReverser, '.svgz': SVGReverser, '.webp': PNGReverser}.get(
+                splitext(val)[1].lower()
+            )
+            if r is None:
                 raise ValueError('Invalid file type to reverse')
+        elif isinstance(val, (bytes, bytearray, memoryview)):
+            return cls(BytesIO(val), output, unsafe)
+        elif hasattr(val, 'read'):
+            ret = list(reverse_stream(val, unsafe))
+            if output is not None:
+                Config(ret, output=output).write(f'reverse.{output}')
+            return ret
         else:
             raise ValueError('Invalid value type to reverse')
-        return r(val, output)
+        return r(val, output, unsafe)
+
+
+def reverse_stream(fp: BinaryIO, unsafe: bool = False) -> Iterator[Settings | list[Color]]:
+    """
+    Reverses a preview read from a binary file object, nothing is written to disk
+    The format is told from the contents, svg is parsed while it is read
+
+    :param fp:     The png, svg, svgz or webp, the file object does not need to be seekable
+    :param unsafe: Whether to load pickled settings, see Reverser
+    :return:       The settings first, then the colors row by row
+    """
+    head = b''
+    while len(head) < 12 and (chunk := fp.read(12 - len(head))):
+        head += chunk
+    if head[:8] == _png_signature or (head[:4] == b'RIFF' and head[8:12] == _webp_signature):
+        # the chunks before the pixel data are enough, from a seekable file only those are read
+        if getattr(fp, 'seekable', lambda: False)():
+            fp.seek(-len(head), SEEK_CUR)
+            image = Image.open(fp)
+        else:
+            image = Image.open(BytesIO(head + fp.read()))
+        yield from PNGReverser(image, unsafe=unsafe)
+    elif head[:2] == _gzip_signature or head.lstrip(b'\xef\xbb\xbf \t\r\n')[:1] == b'<':
+        yield from SVGReverser._reverse(SVGReverser._iterparse(chain([head], _chunks(fp))), unsafe)
+    else:
+        raise ValueError('Invalid file type to reverse')
+
+
+def reverse_bytes(data: bytes | memoryview, unsafe: bool = False) -> u2:
+    """
+    Reverses a preview from its contents, nothing is written to disk
+
+    :param data:   The png, svg, svgz or webp file contents
+    :param unsafe: Whether to load pickled settings, see Reverser
+    :return:       The palette as a Python list
+    """
+    return list(reverse_stream(BytesIO(data), unsafe))
+
+
+# the first bytes of every png file
+_png_signature = b'\x89PNG\r\n\x1a\n'
+
+# the first bytes of every gzip file, like svgz
+_gzip_signature = b'\x1f\x8b'
+
+# the bytes after the size of the RIFF container of every webp file
+_webp_signature = b'WEBP'
+
+# the XMP namespace of the metadata of webp previews
+_xmp_namespace = 'https://github.com/Aonodensetsu/prev_gen'
+
+# Pillow refuses text chunks that decompress to more than 1 MiB, a character takes at most 4 bytes in utf-8
+_palette_chunk = (1 << 20) // 4
+
+
+def _chunks(fp: BinaryIO, size: int = 1 << 16) -> Iterator[bytes]:
+    return iter(partial(fp.read, size), b'')
+
+
+def _gunzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    :param chunks: The contents of a file, piece by piece
+    :return:       The contents decompressed piece by piece if it is gzip, like svgz, otherwise as they are
+    """
+    chunks = iter(chunks)
+    first = next(chunks, b'')
+    if first[:2] != _gzip_signature:
+        yield first
+        yield from chunks
+        return
+    # 31 window bits reads the gzip header
+    z = decompressobj(31)
+    for chunk in chain([first], chunks):
+        yield z.decompress(chunk)
+    yield z.flush()
+
+
+def _palette_keys(text: dict[str, str]) -> Iterator[str]:
+    """
+    :param text: The metadata of a preview
+    :return:     The keys of the chunks the serialized palette is split into, in order
+    """
+    return takewhile(text.__contains__, (f'colorGenPalette{i or ""}' for i in count()))
+
+
+def _xmp_text(xmp: bytes | str) -> dict[str, str]:
+    """
+    :param xmp: The XMP packet of a webp preview
+    :return:    The metadata it holds, as the text chunks of a png preview
+    """
+    tag = f'{{{_xmp_namespace}}}'
+    return {i.tag.removeprefix(tag): i.text or '' for i in ElementTree.fromstring(xmp).iter() if i.tag.startswith(tag)}
+
+
+def _events(parser: ElementTree.XMLPullParser, chunks: Iterable[bytes]) -> Iterator[tuple[str, ElementTree.Element]]:
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
 
 
 class PNGReverser:
     @classmethod
-    def _calc_grid(
-        cls,
-        image_c: Image.Image,
-        image_size: Sequence[int],
-        ch_loc: MutableSequence[int]
-    ) -> tuple[int, int]:
-        grid_size = [0, 0]
+    def _calc_grid(cls, pixels: NDArray) -> tuple[int, int]:
+        """
+        The tiles are as wide as the first run of pixels in the top row
+        and as tall as the first two runs in the left column, the background and the bar
+
+        :param pixels: The image as an (H, W, 4) array
+        :return:       The tile width and height in pixels
+        """
+        grid_size = []
         # x then y, combined for brevity
-        for i in range(2):
-            previous = image_c.getpixel((0, 0))
-            for j in range(0, image_size[i]):
-                c = image_c.getpixel((0, j) if i else (j, 0))  # here we choose y or x
-                if previous != c:
-                    ch_loc[i] -= 1
-                    if ch_loc[i] < 0:
-                        break
-                grid_size[i] += 1
-                previous = c
+        for edge, runs in ((pixels[0], 1), (pixels[:, 0], 2)):
+            changes = np.flatnonzero((edge[1:] != edge[:-1]).any(axis=1)) + 1
+            grid_size.append(int(changes[runs - 1]) if len(changes) >= runs else len(edge))
         return grid_size[0], grid_size[1]
 
     @classmethod
-    def _calc_colors(
-        cls,
-        image: Image.Image,
-        image_c: Image.Image,
-        image_size: Sequence[int],
-        grid_size: Sequence[int]
-    ) -> list[list[Color]]:
-        ret = []
-        index = 0
-        for j in range(0, image_size[1], grid_size[1]):
-            row = []
-            for i in range(0, image_size[0], grid_size[0]):
-                px = image_c.getpixel((i, j))
-                a = Color('%02X%02X%02X' % px[:3], alpha=px[3])
-                if a.alpha > 0.:
-                    key = f'color{index}'
-                    if key in image.text:
-                        a.deserialize_text(image.text[key])
-                index += 1
-                row.append(a)
-            ret.append(row)
-        return ret
+    def _calc_colors(cls, text: dict[str, str], pixels: NDArray, grid_size: Sequence[int]) -> list[list[Color]]:
+        """
+        Previews written before the palette chunk existed are reversed from their pixels
+
+        :param text:      The text chunks of the image, with the texts of each color in its own chunk
+        :param pixels:    The image as an (H, W, 4) array
+        :param grid_size: The tile width and height in pixels
+        :return:          The colors of the tiles, row by row
+        """
+        # the top left pixel of every tile
+        samples = pixels[::grid_size[1], ::grid_size[0]]
+        rows, columns = samples.shape[:2]
+        samples = samples.reshape(-1, 4)
+        h = samples[:, :3].tobytes().hex()
+        fields = [
+            Color.data_deserialize_text(text[f'color{i}'])
+            if a > 0 and f'color{i}' in text
+            else ('', '', '')
+            for i, a in enumerate(samples[:, 3].tolist())
+        ]
+        name, desc_left, desc_right = zip(*fields) if fields else ((), (), ())
+        colors = ColorArray.from_hex(
+            [f'#{h[i:i + 6]}' for i in range(0, len(h), 6)],
+            name,
+            desc_left,
+            desc_right,
+            samples[:, 3] / 255
+        ).to_colors()
+        return [colors[i:i + columns] for i in range(0, rows * columns, columns)]
 
     def __new__(
         cls,
         image: Image.Image | str,
-        output: config_format | None = None
+        output: config_format | None = None,
+        unsafe: bool = False
     ) -> u2:
         """
         Takes an image and returns the palette used to generate it
-        :param image: The png image generated with this tool (or compatible)
+        :param image: The png or webp image generated with this tool (or compatible)
+        :param unsafe: Whether to load pickled settings, see Reverser
         :returns: The palette as a Python list
         """
         if isinstance(image, str):
             image = Image.open(image)
-        settings = Settings.deserialize(image.text['colorGen'])
-        image_c = image.convert('RGBA')
-        image_size = (image_c.width, image_c.height)
-        ch_loc = [0, 1]
-        grid_size = cls._calc_grid(image_c, image_size, ch_loc)
-        ret = [settings, *cls._calc_colors(image, image_c, image_size, grid_size)]
+        # opened files have the chunks before the pixel data in info, reading it does not decode the pixels
+        if 'colorGen' in image.info:
+            text = image.info
+        elif 'xmp' in image.info:
+            text = _xmp_text(image.info['xmp'])
+        else:
+            text = image.text
+        settings = Settings.deserialize(text['colorGen'], unsafe)
+        if 'colorGenPalette' in text:
+            ret = [settings, *Palette.deserialize(''.join(text[k] for k in _palette_keys(text)))]
+        else:
+            pixels = np.asarray(image if image.mode == 'RGBA' else image.convert('RGBA'))
+            grid_size = cls._calc_grid(pixels)
+            ret = [settings, *cls._calc_colors(text, pixels, grid_size)]
         if output is not None:
             Config(ret, output=output).write(f'reverse.{output}')
         return ret
 
 
 class SVGReverser:
+    # the text elements that describe a tile, 'col' is the hex word of tiles without a name
+    _fields = {'hex': 'hex', 'col': 'hex', 'name': 'name', 'desc_left': 'desc_left', 'desc_right': 'desc_right'}
+
     @classmethod
-    def _svg_sift(cls, root: ElementTree.Element, ns: str, max_x: int) -> tuple[list[ElementTree.Element], int]:
-        vals = []
-        # woo-hoo XML parsing
-        for i in root.findall(f'./{ns}*'):
-            # only care about marked values
-            if 'use' not in i.attrib.keys():
-                continue
-            # we don't care about the bars and we already parsed metadata
-            if i.attrib['use'] in ('meta', 'bar'):
+    def _iterparse(cls, chunks: Iterable[bytes]) -> Iterator[ElementTree.Element]:
+        """
+        Parses incrementally, each top level element is discarded once it was handled
+        so that the memory use does not grow with the size of the file
+
+        :param chunks: The contents of the file, piece by piece, svgz is decompressed as it is read
+        :return:       The children of the svg element, as soon as each one is complete
+        """
+        parser = ElementTree.XMLPullParser(('start', 'end'))
+        root = None
+        depth = 0
+        for event, elem in _events(parser, _gunzip(chunks)):
+            if event == 'start':
+                if root is None:
+                    root = elem
+                depth += 1
                 continue
-            # we need the max width to calculate how many tiles horizontally
-            if (v := float(i.attrib['x'])) > max_x:
-                max_x = v
-            vals.append(i)
-        return vals, max_x
+            depth -= 1
+            if depth == 1:
+                yield elem
+                root.clear()
 
     @classmethod
-    def _val_extract(cls, vals: list[ElementTree.Element]) -> list[Color]:
-        ret = []
-        # as long as we have values
-        while vals:
-            # we get the values until another 'bg'
-            cur_val = vals.pop(0)
-            while vals and vals[0].attrib['use'] != 'bg':
-                cur_val.append(vals.pop(0))
-            # we get the text values we need
-            col = (
-                list(x.text for x in cur_val if x.attrib['use'] == 'hex')[0]
-                if any(x.attrib['use'] == 'hex' for x in cur_val)
-                else Color('000000', alpha=0.)
-            )
-            name = (
-                list(x.text or '' for x in cur_val if x.attrib['use'] == 'name')[0]
-                if any(x.attrib['use'] == 'name' for x in cur_val)
-                else ''
-            )
-            desc_left = (
-                list(x.text or '' for x in cur_val if x.attrib['use'] == 'desc_left')[0]
-                if any(x.attrib['use'] == 'desc_left' for x in cur_val)
-                else ''
-            )
-            desc_right = (
-                list(x.text or '' for x in cur_val if x.attrib['use'] == 'desc_right')[0]
-                if any(x.attrib['use'] == 'desc_right' for x in cur_val)
-                else ''
-            )
-            # and remake the color
-            ret.append(Color(col, name, desc_left, desc_right))
-        return ret
+    def _tile(cls, fields: dict[str, str]) -> Color:
+        """
+        :param fields: The texts found for the tile, keyed by purpose
+        :return:       The color of the tile, tiles without a hex word are transparent
+        """
+        return Color.from_hex(
+            fields.get('hex', '0000'),
+            fields.get('name', ''),
+            fields.get('desc_left', ''),
+            fields.get('desc_right', '')
+        )
+
+    @classmethod
+    def stream(
+        cls,
+        tree: ElementTree.ElementTree | str | BinaryIO,
+        unsafe: bool = False
+    ) -> Iterator[Settings | list[Color]]:
+        """
+        Reverses in one pass over the elements, a tile starts at its background
+        and a row starts whenever the background moves down
+        This is probably not compatible with many other generators
+        As it uses the non-standard keyword "use" to determine element purpose
+
+        :param tree:   The xml.etree.ElementTree, filename or binary file object to load
+        :param unsafe: Whether to load pickled settings, see Reverser
+        :return:       The settings first, then the colors row by row
+        """
+        if isinstance(tree, ElementTree.ElementTree):
+            yield from cls._reverse(iter(tree.getroot()), unsafe)
+        elif isinstance(tree, str):
+            with open(tree, 'rb') as f:
+                yield from cls._reverse(cls._iterparse(_chunks(f)), unsafe)
+        else:
+            yield from cls._reverse(cls._iterparse(_chunks(tree)), unsafe)
+
+    @classmethod
+    def _reverse(cls, elements: Iterator[ElementTree.Element], unsafe: bool) -> Iterator[Settings | list[Color]]:
+        """
+        :param elements: The children of the svg element
+        :param unsafe:   Whether to load pickled settings, see Reverser
+        :return:         The settings first, then the colors row by row
+        """
+        settings = None
+        # rows found before the metadata wait for it, the generator always puts it first
+        pending = []
+        row = []
+        row_y = None
+        fields = None
+        for i in elements:
+            use = i.get('use')
+            if use == 'bg':
+                if fields is not None:
+                    row.append(cls._tile(fields))
+                if (y := i.get('y')) != row_y and row:
+                    pending.append(row)
+                    row = []
+                row_y = y
+                fields = {}
+            elif use == 'meta' and settings is None:
+                settings = Settings.deserialize(i.text, unsafe)
+                yield settings
+            elif fields is not None and (k := cls._fields.get(use)) is not None:
+                # the first element of a kind wins
+                fields.setdefault(k, i.text or '')
+            if settings is not None and pending:
+                yield from pending
+                pending = []
+        if settings is None:
+            raise ValueError('No prev_gen metadata found to reverse')
+        if fields is not None:
+            row.append(cls._tile(fields))
+        yield from pending
+        if row:
+            yield row
 
     def __new__(
         cls,
-        tree: ElementTree.ElementTree | str,
-        output: config_format | None = None
+        tree: ElementTree.ElementTree | str | BinaryIO,
+        output: config_format | None = None,
+        unsafe: bool = False
     ) -> u2:
         """
-        This is probably not compatible ith many other generators
-        As it uses the non-standard keyword "use" to determine element purpose
-        :param tree: The xml.etree.ElementTree or filename to load
-        """
-        if isinstance(tree, str):
-            tree = ElementTree.parse(tree)
-        root = tree.getroot()
-        ns = root.tag.removesuffix('svg')
-        # get the svg element <text use='meta'> which is set by the generator
-        settings = Settings.deserialize(list(
-            i for i in root.findall(f'./{ns}text') if 'use' in i.attrib and i.attrib['use'] == 'meta')[0].text)
-        max_x = -1
-        # woo-hoo XML parsing
-        vals, max_x = cls._svg_sift(root, ns, max_x)
-        ret = cls._val_extract(vals)
-        # make the result a 2d list and include settings
-        n = int(max_x / settings.grid_width) + 1
-        ret = [settings] + [ret[i:i + n] for i in range(0, len(ret), n)]
+        :param tree:   The xml.etree.ElementTree, filename or binary file object to load
+        :param unsafe: Whether to load pickled settings, see Reverser
+        """
+        ret = list(cls.stream(tree, unsafe))
         if output is not None:
             Config(ret, output=output).write(f'reverse.{output}')
         return ret
@@ -1,9 +1,10 @@
 from argparse import ArgumentParser, Namespace
 from os.path import splitext
 
+from .previewer import Previewer, render_stream
 from .types import config_format, image_format
-from .previewer import Previewer
 from .reverser import Reverser
+from .palette import Palette
 from .config import Config
 
 
@@ -13,12 +14,14 @@ def parse_args() -> tuple[ArgumentParser, Namespace]:
     """
     p = ArgumentParser(description='The CLI interface of the prev_gen library')
     p.add_argument('--show', action='store_true', help='preview the result')
-    p.add_argument('--unsafe', action='store_true', help='allow loading python files')
+    p.add_argument('--unsafe', action='store_true', help='allow loading python files and pickled image metadata')
+    p.add_argument('-j', '--jobs', type=int, default=1, help='processes to draw png images in, 0 for one per core')
+    p.add_argument('--stream', action='store_true', help='write png images a row of tiles at a time, to save memory')
     p.add_argument(
         '-o',
         '--out',
         help='output filetype',
-        choices=('json', 'png', 'py', 'svg', 'toml', 'yaml')
+        choices=('json', 'png', 'py', 'svg', 'svgz', 'toml', 'webp', 'yaml')
     )
     p.add_argument('file', help='the filename to convert')
     return p, p.parse_args()
@@ -36,7 +39,7 @@ def convert_img(p: ArgumentParser, args: Namespace, ext: image_format, fn: str):
     if args.out not in ('json', 'py', 'toml', 'yaml'):
         p.error('The out format for this file needs to be yaml, json, toml or py')
     # noinspection PyTypeChecker
-    o = Config(Reverser(args.file, output=ext), output=args.out).write(f'{fn}.{args.out}')
+    o = Config(Reverser(args.file, unsafe=args.unsafe), output=args.out).write(f'{fn}.{args.out}')
     if args.show:
         print(o)
 
@@ -49,8 +52,8 @@ def convert_config(p: ArgumentParser, args: Namespace, ext: config_format):
     """
     if args.out is None:
         args.out = 'png'
-    if args.out not in ('png', 'svg'):
-        p.error('The out format for this file needs to be png or svg')
+    if args.out not in ('png', 'svg', 'svgz', 'webp'):
+        p.error('The out format for this file needs to be png, svg, svgz or webp')
     with open(args.file, 'r') as f:
         fc = f.read()
     if ext == 'yml':
@@ -62,7 +65,7 @@ def convert_config(p: ArgumentParser, args: Namespace, ext: config_format):
                     'Loading arbitrary python code is unsafe, please review the python file, then use the --unsafe flag'
                 )
             try:
-                o = Config.read(fc, output=ext).palette
+                o = Config.loads(fc, output=ext).palette
             except Exception as e:
                 print(e)
                 p.error(
@@ -70,9 +73,15 @@ def convert_config(p: ArgumentParser, args: Namespace, ext: config_format):
                     'Urgently check the file you just loaded for malicious code!'
                 )
         case _:
-            o = Config.read(fc, output=ext).palette
+            o = Config.loads(fc, output=ext).palette
+    if args.stream:
+        if args.show:
+            p.error('Streamed images are never held in memory, they cannot be shown')
+        with open(f'{Palette(o).settings.file_name}.{args.out}', 'wb') as f:
+            f.writelines(render_stream(o, args.out))
+        return
     # noinspection PyTypeChecker
-    Previewer(o, output=args.out, show=args.show, save=True)
+    Previewer(o, output=args.out, show=args.show, save=True, workers=args.jobs or None)
 
 
 def prev_gen():
@@ -82,9 +91,9 @@ def prev_gen():
     p, args = parse_args()
     fn, ext = splitext(args.file)
     ext = ext[1:]
-    if ext not in ('json', 'png', 'py', 'svg', 'toml', 'yaml', 'yml'):
+    if ext not in ('json', 'png', 'py', 'svg', 'svgz', 'toml', 'webp', 'yaml', 'yml'):
         p.error('File format not recognized')
-    if ext in ('png', 'svg'):
+    if ext in ('png', 'svg', 'svgz', 'webp'):
         convert_img(p, args, ext, fn)
         return
     convert_config(p, args, ext)
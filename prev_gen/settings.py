@@ -1,8 +1,9 @@
 from __future__ import annotations
 
+from json import JSONDecodeError, dumps, loads
 from dataclasses import dataclass, field
-from base64 import b64decode, b64encode
-from pickle import dumps, loads
+from pickle import loads as unpickle
+from base64 import b64decode
 
 
 @dataclass(kw_only=True, slots=True)
@@ -13,6 +14,8 @@ class Settings:
     Attributes:
         bar_height:          Height of the darkened bar at the bottom of each tile
 
+        compact:             for svg = write the colors and typography once as css classes, for smaller files
+
         desc_offset_x:       Horizontal offset of the corner descriptions
 
         desc_offset_y:       Vertical offset of the corner descriptions
@@ -45,9 +48,14 @@ class Settings:
 
         name_size:           Text size of the color name
 
+        profile:             for png and webp = how hard to compress, 'fast', 'default' or 'small'
+
+                             small png also indexes the colors, when that keeps every flat area exact
+
         show_hash:           Display the hash symbol before hex colors
     """
     bar_height: int = 10
+    compact: bool = False
     desc_offset_x: int = 15
     desc_offset_y: int = 20
     desc_size: int = 26
@@ -63,41 +71,79 @@ class Settings:
     hex_upper: bool = True
     name_offset: int = -10
     name_size: int = 40
+    profile: str = 'default'
     show_hash: bool = False
 
     def to_dict(self) -> dict:
         """
         :return: The dictionary of non-default values
         """
-        # noinspection PyUnresolvedReferences
-        names = Settings.__slots__
-        default_cls = Settings()
-        default = {i: getattr(default_cls, i) for i in names}
-        actual = {i: getattr(self, i) for i in names}
-        return {k: v for k, v in actual.items() if default[k] != v}
+        return {k: v for k, d in _defaults.items() if (v := getattr(self, k)) != d}
 
     @classmethod
     def data_serialize(cls, data: dict) -> str:
-        return str(b64encode(dumps(data)), 'latin1')
+        """
+        :param data: The dictionary of non-default values
+        :return:     A compact json representation, tagged with the format version
+        """
+        return dumps({'v': _version, **data}, separators=(',', ':'))
 
     def serialize(self) -> str:
         """
-        :return: A base64-encoded representation of the class
+        :return: A compact json representation of the non-default values
         """
         return self.data_serialize(self.to_dict())
 
     @classmethod
-    def data_deserialize(cls, data: str) -> dict:
+    def data_deserialize(cls, data: str, unsafe: bool = False) -> dict:
         """
-        :param data: The serialized representation to decode into a dictionary
-        :return: The decoded value
+        Only known settings of the expected types are accepted
+        Metadata written by older versions is a pickle, which can run arbitrary code when loaded
+
+        :param data:   The serialized representation to decode into a dictionary
+        :param unsafe: Whether to load pickled metadata, only do so for files from a trusted source
+        :return:       The decoded value
         """
-        return loads(b64decode(bytes(data, 'latin1')))
+        if not data.startswith('{'):
+            if not unsafe:
+                raise ValueError(
+                    'The settings were saved by an older version as a pickle, which can run arbitrary code when loaded'
+                    ', only if the file is from a trusted source, load it with unsafe=True (--unsafe)'
+                )
+            return unpickle(b64decode(bytes(data, 'latin1')))
+        try:
+            data = loads(data)
+        except JSONDecodeError:
+            raise ValueError('The settings are not valid json')
+        if not isinstance(data, dict) or data.pop('v', None) != _version:
+            raise ValueError('The settings have an unsupported format version')
+        for k, v in data.items():
+            if k not in _types:
+                raise ValueError(f'Unknown setting <{k}>')
+            if type(v) not in _types[k] or (
+                isinstance(v, dict) and not all(isinstance(i, str) and type(j) in _scalars for i, j in v.items())
+            ):
+                raise ValueError(f'The setting <{k}> has an invalid value <{v}>')
+        return data
 
     @classmethod
-    def deserialize(cls, data: str) -> Settings:
+    def deserialize(cls, data: str, unsafe: bool = False) -> Settings:
         """
-        :param data: The serialized representation to decode into Settings
-        :return: The decoded Settings
+        :param data:   The serialized representation to decode into Settings
+        :param unsafe: Whether to load pickled metadata, see data_deserialize
+        :return:       The decoded Settings
         """
-        return Settings(**cls.data_deserialize(data))
+        return Settings(**cls.data_deserialize(data, unsafe))
+
+
+# the current serialization format, bumped on incompatible changes
+_version = 1
+
+# values allowed in the dictionary settings, like font_opts
+_scalars = (str, int, float, bool)
+
+# noinspection PyUnresolvedReferences
+_defaults = {i: getattr(Settings(), i) for i in Settings.__slots__}
+
+# the types each setting may have when decoded, derived from the defaults
+_types = {k: (int, float) if type(v) is int else (type(v),) for k, v in _defaults.items()}
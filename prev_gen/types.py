@@ -2,7 +2,9 @@ from typing import Literal, TypeAlias
 
 image_format: TypeAlias = Literal[
     'png',
-    'svg'
+    'svg',
+    'svgz',
+    'webp'
 ]
 
 config_format: TypeAlias = Literal[
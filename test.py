@@ -1,9 +1,35 @@
-from os.path import exists
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from os.path import exists, getsize
+from xml.etree import ElementTree
+from io import BytesIO, StringIO
+from os import listdir, remove, utime
+from gzip import decompress
+from shutil import copyfile
 from math import isclose
-from os import remove
 
-from prev_gen import Color, Config, Palette, Previewer, Reverser, Settings
-from pytest import raises
+from prev_gen import Color, ColorArray, Config, Palette, Previewer, PreviewSession, RenderCache, Reverser, Settings
+from prev_gen.previewer import PNGPreviewer, SVGPreviewer, _cache_key, _sprite, bar_colors, load_font
+from prev_gen import render_bytes, render_many, render_stream, reverse_bytes, reverse_stream
+from prev_gen.conversion import conversion_path, convert
+from prev_gen.previewer import palette_colors
+from prev_gen.fonts import bundled, font_css
+from prev_gen.cache import FontCache
+from colour import convert as colour_convert
+from prev_gen.kernels import rgb_to, to_rgb
+from prev_gen.reverser import SVGReverser
+from pytest import fixture, importorskip, raises
+from PIL import Image, ImageDraw
+from drawsvg import Drawing, Text
+import numpy as np
+
+
+@fixture(autouse=True)
+def cache_directory(monkeypatch):
+    # the disk tiers of every test write to a new directory, never to the user cache
+    with TemporaryDirectory() as d:
+        monkeypatch.setenv('PREV_GEN_CACHE', d)
+        yield d
 
 
 def test_input_modes():
@@ -23,6 +49,35 @@ def test_invalid_input():
         Color({})
 
 
+def test_fast_constructors():
+    assert Color.from_hex('#FF0000') == Color('ff0000')
+    assert Color.from_css('Crimson').hexadecimal == Color('crimson').hexadecimal == '#dc143c'
+    assert Color.from_css('#dc143c') == Color('crimson')
+    assert Color.from_rgb((0.2, 0.5, 0.3)) == Color((0.2, 0.5, 0.3), model='rgb')
+    assert Color.from_array((0.2, 0.5, 0.3), model='hsl') == Color((0.2, 0.5, 0.3), model='hsl')
+    assert isclose(Color('#00f8').alpha, 0x88 / 255)
+    assert Color('0000').alpha == 0.
+    with raises(ValueError):
+        Color.from_hex('crimson')
+
+
+def test_bulk_hex():
+    a = ColorArray.from_hex(['f00', '#00FF00', 'navy', '0000'], alpha=0.5)
+    assert a.hexadecimal.tolist() == ['#ff0000', '#00ff00', '#000080', '#000000']
+    assert a.alpha.tolist() == [0.5, 0.5, 0.5, 0.]
+    assert a[2] == Color('navy')
+
+
+def test_oklab_kernels():
+    rgb = np.random.default_rng(0).random((100, 3))
+    for model in rgb_to:
+        assert np.allclose(rgb_to[model](rgb), convert(rgb, 'rgb', model), atol=1e-3)
+        assert np.allclose(to_rgb[model](rgb_to[model](rgb)), rgb, atol=1e-4)
+    oklab = rgb_to['oklab'](rgb)
+    oklab[:, 0] *= 0.9
+    assert np.allclose(bar_colors(rgb_to['oklab'](rgb)), convert(oklab, 'oklab', 'srgb'), atol=1e-3)
+
+
 def test_color_can_be_compared():
     assert Color('crimson') == 'crimson'
     assert Color('crimson') == 'dc143c'
@@ -67,6 +122,23 @@ def test_colors_infer_properties():
     assert all(isclose(x, y, rel_tol=0.001) for x, y in zip(c.oklch, (0.6279, 0.2577, 0.0812)))
 
 
+def test_color_caches_models():
+    c = Color((0.2, 0.5, 0.3))
+    assert not hasattr(c, '__dict__')
+    hsl = c.hsl
+    hsl[0] = 1.
+    assert c.hsl != hsl
+    assert c.HSL == c.hsl
+
+
+def test_conversion_paths_cached():
+    c = (0.2, 0.5, 0.3)
+    for m in ('oklab', 'hsl', 'cie lab'):
+        assert (convert(c, 'srgb', m) == colour_convert(c, 'srgb', m)).all()
+    assert convert(c, 'srgb', 'hexadecimal') == colour_convert(c, 'srgb', 'hexadecimal')
+    assert conversion_path('srgb', 'oklab') is conversion_path('srgb', 'oklab')
+
+
 def test_color_serializable():
     c = Color('000000', 'name', 'descLeft', 'descRight')
     des = Color('000000').deserialize_text(c.serialize_text())
@@ -76,9 +148,41 @@ def test_color_serializable():
 
 
 def test_settings_serialize():
-    assert Settings().serialize() == 'gAR9lC4='
-    s = Settings(file_name='nonDefault')
+    assert Settings().serialize() == '{"v":1}'
+    s = Settings(file_name='non<Default>', font_opts={'wght': 400})
     assert Settings.deserialize(s.serialize()) == s
+    # older versions pickled the settings, which is only loaded when asked to
+    with raises(ValueError):
+        Settings.deserialize('gAR9lC4=')
+    assert Settings.deserialize('gAR9lC4=', unsafe=True) == Settings()
+    for data in ('{"v":2}', '{"v":1,"eval":1}', '{"v":1,"grid_width":"1"}', '{"v":1,"font_opts":{"a":[]}}'):
+        with raises(ValueError):
+            Settings.deserialize(data)
+    assert Color.data_deserialize_text(Color.data_serialize_text('name', '', 'right')) == ['name', '', 'right']
+    assert Color.data_deserialize_text(Color.data_serialize_text()) == ['', '', '']
+    assert Color.data_deserialize_text('bmFtZQBsZWZ0AA==') == ['name', 'left', '']
+
+
+def test_color_array():
+    a = ColorArray([(0.2, 0.5, 0.3), (0.4, 0.2, 0.7)], name=['green', 'purple'], alpha=0.5)
+    assert a.srgb.shape == (2, 3)
+    assert a.hexadecimal.shape == (2,)
+    assert a[0] == Color((0.2, 0.5, 0.3))
+    assert a[1].name == 'purple'
+    assert a[1].alpha == 0.5
+    assert len(a[1:]) == 1
+    # one color out of gamut must not change the hex of the others
+    v = [(0.5, 0.1, 150.), (0.9, 0.5, 30.), (0.3, 0.3, 260.), (0.6, 0.05, 40.)]
+    a = ColorArray(np.array(v), model='oklch')
+    assert a.hexadecimal.tolist() == [Color(i, model='oklch').hexadecimal for i in v]
+    assert [i['color'] for i in a.to_dicts()] == [Color(i, model='oklch').to_dict()['color'] for i in v]
+
+
+def test_color_array_consumers():
+    a = ColorArray([Color('f00', 'red'), Color('0000')])
+    assert Palette(a).colors == Palette([Color('f00'), Color('0000')]).colors
+    assert Palette([a]).width == 2
+    assert str(Config([a], output='yaml')) == str(Config([[Color('f00', 'red'), Color('0000')]], output='yaml'))
 
 
 def test_table_init():
@@ -101,10 +205,82 @@ def test_table_iterable():
     assert it == 4
 
 
+def test_palette_layout():
+    p = Palette([Settings(grid_width=10, grid_height=5), *(Color('f00') for _ in range(5))])
+    assert p.layout.tolist() == [[0, 0, 9, 4], [10, 0, 9, 4], [20, 0, 9, 4], [0, 5, 9, 4], [10, 5, 9, 4]]
+    # loops over the same palette do not interfere
+    assert [(tuple(a.pos), tuple(b.pos)) for a in p for b in p] == [
+        (tuple(a.pos), tuple(b.pos)) for a in p[:] for b in p[:]
+    ]
+    assert len(list(p)) == len(p) == 5
+    assert tuple(p[-1].pos) == (10, 5) and tuple(p[1].size) == (9, 4)
+    assert [[tuple(t.pos) for t in r] for r in p.rows()] == [[(0, 0), (10, 0), (20, 0)], [(0, 5), (10, 5)]]
+    assert [len(c) for c in p.columns()] == [2, 2, 1]
+
+
+def test_palette_input_unchanged():
+    rows = [[Color('f00', 'red')], [Color('0f0'), Color('00f')], [Color('fff')]]
+    before = [list(r) for r in rows]
+    p = Palette(rows)
+    Config([Settings(), *rows], output='json')
+    assert rows == before and all(isinstance(c, Color) for r in rows for c in r)
+    # both padding tiles are the same empty tile
+    assert p.colors[1] is p.colors[5] and p.colors[1].alpha == 0.
+
+
 def test_generate_png():
     assert str(type(Previewer([Color('f00')], show=False))) == '<class \'PIL.Image.Image\'>'
 
 
+def test_png_fonts_cached():
+    Previewer([Color('f00', 'red', 'left', 'right')], show=False)
+    misses = load_font.cache_info().misses
+    Previewer([Color('0f0', 'green', 'left', 'right') for _ in range(3)], show=False)
+    assert load_font.cache_info().misses == misses
+
+
+def test_png_raster():
+    p = Palette([Settings(grid_width=7, grid_height=5, bar_height=1), [Color('f00'), Color('0f08')], [Color('00f')]])
+    layer = PNGPreviewer._draw_layer(p, palette_colors(p.colors)[0])
+    img = Image.new('RGBA', tuple(p.size))
+    draw = ImageDraw.Draw(img, 'RGBA')
+    for t, bar in zip(p, bar_colors(np.array([c.oklab for c in p.colors]))):
+        if t.col.alpha >= 0.005:
+            (l, y), (w, h) = t.pos, t.size
+            draw.rectangle(((l, y), (l + w, y + h - 2)), fill=tuple(int(x * 255) for x in (*t.col.srgb, t.col.alpha)))
+            draw.rectangle(((l, y + h - 1), (l + w, y + h)), fill=tuple(int(x * 255) for x in (*bar, t.col.alpha)))
+    assert (np.repeat(layer, 7, axis=1) == np.asarray(img)).all()
+
+
+def test_png_text_sprites():
+    font = load_font(bundled, 26)
+    # drawn as PIL draws it, at positions whose fractions PIL places the glyphs by
+    for xy, anchor in (((30, 15), 'mm'), ((30.5, 7.5), 'mm'), ((-3.5, -0.5), 'lt'), ((59, 2), 'rt')):
+        a, b = Image.new('RGBA', (60, 30), (0, 0, 255, 128)), Image.new('RGBA', (60, 30), (0, 0, 255, 128))
+        fill = (255, 255, 255, 128)
+        ImageDraw.Draw(a, 'RGBA').text(xy, 'F0A light', font=font, fill=fill, anchor=anchor)
+        PNGPreviewer._draw_text(ImageDraw.Draw(b, 'RGBA'), (0, 0), (60, 30), xy, 'F0A light', font, fill, anchor)
+        assert (np.asarray(a) == np.asarray(b)).all()
+    _sprite.cache_clear()
+    row = [Color(i, 'light', 'light', 'dark') for i in ('f00', '0f0', '00f')]
+    Previewer([Settings(grid_width=61), row], show=False)
+    # the name and the descriptions are rasterized once, the hex values once each
+    assert (_sprite.cache_info().misses, _sprite.cache_info().hits) == (6, 6)
+
+
+def test_png_workers():
+    rows = [[Color('f00', 'a name that is longer than its tile', 'left'), Color('0f08', 'name', desc_right='right')]
+            for _ in range(5)]
+    palette = [Settings(grid_height=40, name_size=48), *rows]
+    a = Previewer(palette, show=False)
+    b = Previewer(palette, show=False, workers=2)
+    assert (np.asarray(a) == np.asarray(b)).all() and a.text == b.text
+    # texts wholly outside the image
+    rows = [[Color('f00', desc_right='right'), Color('0f0', desc_right='right')] for _ in range(4)]
+    palette = [Settings(desc_offset_x=-400, desc_offset_y=-30), *rows]
+    assert (np.asarray(Previewer(palette, show=False)) == np.asarray(Previewer(palette, show=False, workers=2))).all()
+
+
 def test_save_png():
     Previewer([Settings(file_name='testSavePNG'), Color('f00')], show=False, save=True)
     assert exists('testSavePNG.png')
@@ -118,12 +294,76 @@ def test_reverse_png():
     Reverser(a)
 
 
+def test_reverse_png_colors():
+    c = [Color('f00', 'red', 'left'), Color('0f0', alpha=0.5), Color('0000'), Color('00f', desc_right='right')]
+    img = Previewer(c, show=False)
+    _, *rows = Reverser(img)
+    assert [[i.alpha for i in r] for r in rows] == [[1., 128 / 255], [0., 1.]]
+    # previews without the palette chunk are reversed from their pixels, with a text chunk per color
+    img.text = {'colorGen': img.text['colorGen'], 'color0': Color.data_serialize_text('red', 'left')}
+    _, *pixel_rows = Reverser(img)
+    assert [[i.alpha for i in r] for r in pixel_rows] == [[1., 127 / 255], [0., 1.]]
+    for x in rows, pixel_rows:
+        assert [[i.hexadecimal for i in r] for r in x] == [['#ff0000', '#00ff00'], ['#000000', '#0000ff']]
+    assert (rows[0][0].name, rows[0][0].desc_left, rows[1][1].desc_right) == ('red', 'left', 'right')
+    assert (pixel_rows[0][0].name, pixel_rows[0][0].desc_left) == ('red', 'left')
+
+
+def test_reverse_png_metadata_only():
+    c = [Color('f00', 'red', 'left'), Color('0f08', 'ünï'), Color('0000')]
+    Previewer([Settings(file_name='testReversePNGMeta'), c], show=False, save=True)
+    img = Image.open('testReversePNGMeta.png')
+    s, row = Reverser(img)
+    # the pixel data is still waiting to be decoded
+    assert img.tile
+    img.close()
+    remove('testReversePNGMeta.png')
+    assert s == Settings(file_name='testReversePNGMeta')
+    assert [(i.hexadecimal, i.name, i.desc_left) for i in row] == [
+        ('#ff0000', 'red', 'left'), ('#00ff00', 'ünï', ''), ('#000000', '', '')
+    ]
+
+
+def test_reverse_png_large_palette():
+    rows = [[Color(f'{r:02x}{c:02x}80', f'ünïcode name {r} {c}') for c in range(200)] for r in range(200)]
+    p = Palette([Settings(), *rows])
+    # only the metadata is of interest, the pixels of so many tiles would take long to draw
+    img = Image.new('RGBA', (1, 1))
+    PNGPreviewer._set_meta(img, p)
+    assert len(p.serialize().encode()) > 1 << 20 and 'colorGenPalette1' in img.text
+    buf = BytesIO()
+    img.save(buf, 'PNG', pnginfo=PNGPreviewer._pnginfo(img.text))
+    _, *reversed_rows = Reverser(Image.open(buf))
+    assert [[(i.hexadecimal, i.name) for i in r] for r in reversed_rows] == [
+        [(i.hexadecimal, i.name) for i in r] for r in rows
+    ]
+
+
 def test_generate_svg():
     assert str(type(Previewer([Color('f00')], show=False, output='svg'))) == (
         '<class \'xml.etree.ElementTree.ElementTree\'>'
     )
 
 
+def test_svg_font_embedded():
+    font_css('Nunito', {}, 'abc')
+    hits = font_css.cache_info().hits
+    svg = ElementTree.tostring(Previewer([Color('f00', 'abc')], show=False, output='svg').getroot())
+    assert b'@font-face' in svg and b'fonts.g' not in svg
+    sizes = len(font_css('Nunito', {}, 'cba')), len(font_css('Nunito', {}, 'abcdefghijklmnopqrstuvwxyz'))
+    assert font_css.cache_info().hits > hits
+    # the font is only cut down to the glyphs in the palette by the optional subsetter
+    importorskip('fontTools.subset')
+    # the embedded fonts on disk are bounded like renders
+    with TemporaryDirectory() as d:
+        fonts = FontCache(memory_size=0, disk_size=2 << 10, directory=d)
+        for i in range(3):
+            fonts.put(f'{i:064x}', 'css', bytes(1 << 10))
+        assert sorted(listdir(d)) == [f'{1:064x}.css', f'{2:064x}.css']
+        assert fonts.get(f'{2:064x}', 'css') == bytes(1 << 10)
+    assert len(svg) < getsize(bundled) and sizes[0] < sizes[1]
+
+
 def test_save_svg():
     Previewer([Settings(file_name='testSaveSVG'), Color('f00')], show=False, save=True, output='svg')
     assert exists('testSaveSVG.svg')
@@ -137,6 +377,234 @@ def test_reverse_svg():
     Reverser(a)
 
 
+def test_reverse_svg_stream():
+    c = [[Color('f00', 'red', 'left'), Color('0f08')], [Color('0000'), Color('00f', desc_right='right')]]
+    Previewer([Settings(file_name='testReverseSVGStream', show_hash=False), *c], show=False, save=True, output='svg')
+    rows = SVGReverser.stream('testReverseSVGStream.svg')
+    assert next(rows) == Settings(file_name='testReverseSVGStream', show_hash=False)
+    rows = list(rows)
+    remove('testReverseSVGStream.svg')
+    assert [[i.hexadecimal for i in r] for r in rows] == [['#ff0000', '#00ff00'], ['#000000', '#0000ff']]
+    assert [[i.alpha for i in r] for r in rows] == [[1., 0x88 / 255], [0., 1.]]
+    assert (rows[0][0].name, rows[0][0].desc_left, rows[1][1].desc_right) == ('red', 'left', 'right')
+
+
+def test_preview_session():
+    rows = [[Color('f00', 'red', 'a long description'), Color('0f08', 'a name that is longer than its tile')],
+            [Color('0000'), Color('00f', desc_right='right')], [Color('ff0'), Color('0ff', 'cyan')]]
+    for output in ('png', 'svg'):
+        session = PreviewSession(output)
+        img = session.update([Settings(), *rows])
+        for tile in (Color('f0f', 'a very very long name indeed'), Color('0000'), Color('abc', desc_left='left')):
+            rows[1][0] = tile
+            assert session.update([Settings(), *rows]) is img
+            ref = Previewer([Settings(), *rows], show=False, output=output)
+            if output == 'png':
+                assert (np.asarray(img) == np.asarray(ref)).all() and img.text == ref.text
+            else:
+                assert ElementTree.tostring(img.getroot()) == ElementTree.tostring(ref.getroot())
+        # other settings draw everything again
+        assert session.update([Settings(show_hash=True), *rows]) is not img
+    # a text wholly above the palette reaches no tile
+    s = Settings(desc_offset_y=-30)
+    session = PreviewSession('png')
+    session.update([s, [Color('f00'), Color('0f0')]])
+    row = [Color('f00', desc_left='left text long long long long long'), Color('0f0')]
+    assert (np.asarray(session.update([s, row])) == np.asarray(Previewer([s, row], show=False))).all()
+
+
+def test_render_many():
+    rng = np.random.default_rng(0)
+    names = ['', 'red', 'a name that is longer than its tile', 'ünï']
+    # few different texts, svg embeds the font with the glyphs of each palette and subsetting it takes a while
+    colors = [
+        Color(c, names[i % 4], desc_right=names[i % 3]) for i, c in enumerate(('f00', '0f08', '123', 'abc', '0000'))
+    ]
+    palettes = [
+        [Settings(grid_width=int(rng.integers(60, 120)), grid_height=60, name_size=20, desc_size=12),
+         *rng.choice(colors, int(rng.integers(1, 6))).tolist()]
+        for _ in range(200)
+    ]
+    for output in ('png', 'svg'):
+        serial = [Previewer(p, show=False, output=output) for p in palettes]
+        for images in render_many(palettes, output, workers=8), render_many(palettes[::-1], output, workers=8)[::-1]:
+            if output == 'png':
+                assert all((np.asarray(a) == np.asarray(b)).all() and a.text == b.text for a, b in zip(images, serial))
+            else:
+                assert [ElementTree.tostring(i.getroot()) for i in images] == [
+                    ElementTree.tostring(i.getroot()) for i in serial
+                ]
+    # conversions through colour-science set its global scale, threads take turns
+    values = rng.random((200, 3)).tolist()
+    serial = [Color(i, model='hsv').srgb for i in values]
+    with ThreadPoolExecutor(8) as pool:
+        assert list(pool.map(lambda i: Color(i, model='hsv').srgb, values)) == serial
+    with raises(ValueError):
+        render_many(palettes, 'jpg')
+
+
+def test_bytes_api():
+    class Pipe:
+        # not seekable, and reads return less than asked for
+        def __init__(self, data: bytes):
+            self.f = BytesIO(data)
+
+        def read(self, n: int = -1) -> bytes:
+            return self.f.read(min(n, 5) if n > 0 else n)
+
+    files = set(listdir())
+    palette = [Settings(file_name='bytes'), [Color('f00', 'red', 'left'), Color('0f08')], [Color('00f', 'ünï')]]
+    for output in ('png', 'svg'):
+        data = render_bytes(palette, output)
+        rows = reverse_bytes(data)
+        assert rows[0] == Settings(file_name='bytes')
+        assert [[(i.hexadecimal, i.name) for i in r] for r in rows[1:]] == [
+            [('#ff0000', 'red'), ('#00ff00', '')], [('#0000ff', 'ünï'), ('#000000', '')]
+        ]
+        assert reverse_bytes(memoryview(data)) == list(reverse_stream(Pipe(data))) == Reverser(data) == rows
+    with raises(ValueError):
+        reverse_bytes(b'GIF89a')
+    c = Config(palette, output='json')
+    assert Config.loads(c.dumps().encode('utf-8'), 'json').dumps() == c.dumps()
+    with BytesIO() as b, StringIO() as s:
+        c.dump(b).dump(s)
+        b.seek(0)
+        assert Config.load(b, 'json').dumps() == s.getvalue() == c.dumps()
+    assert set(listdir()) == files
+
+
+def test_render_cache():
+    palette = [Settings(file_name='cached'), [Color('f00', 'red', 'left'), Color('0f08')], [Color('00f', 'ünï')]]
+    with TemporaryDirectory() as d:
+        cache = RenderCache(directory=d)
+        for output in ('png', 'svg'):
+            data = render_bytes(palette, output)
+            assert render_bytes(palette, output, cache=cache) == data
+            assert render_bytes(palette, output, cache=cache) == data
+            # a new cache finds it on disk
+            assert render_bytes(palette, output, cache=RenderCache(directory=d)) == data
+        assert (cache.hits, cache.misses) == (2, 2)
+        img = Previewer(palette, show=False, cache=cache)
+        assert cache.hits == 3 and img.text == PNGPreviewer(palette, show=False).text
+        changed = [Settings(file_name='cached'), [Color('f00', 'red', 'right'), Color('0f08')], [Color('00f', 'ünï')]]
+        assert render_bytes(changed, cache=cache) != render_bytes(palette, cache=cache)
+        assert cache.misses == 3
+        cache.clear()
+        assert listdir(d) == []
+        small = RenderCache(disk_size=len(data) * 3 // 2, directory=d)
+        render_bytes(palette, 'svg', cache=small)
+        render_bytes(changed, 'svg', cache=small)
+        assert len(listdir(d)) == 1
+        # webp is drawn as png is, keyed by the font file png draws with and not the one svg embeds
+        for name in ('font.otf', 'font.otf.ttf'):
+            copyfile(bundled, f'{d}/{name}')
+        webp = Palette([Settings(font_name=f'{d}/font.otf'), Color('f00')])
+        key = _cache_key(webp, 'webp')
+        utime(f'{d}/font.otf.ttf', (0, 0))
+        assert _cache_key(webp, 'webp') != key
+        for name in ('font.otf', 'font.otf.ttf'):
+            remove(f'{d}/{name}')
+        # only the files of the cache are removed
+        for name in ('my_photo.png', 'logo.svg'):
+            with open(f'{d}/{name}', 'wb') as f:
+                f.write(data)
+        small.clear()
+        assert sorted(listdir(d)) == ['logo.svg', 'my_photo.png']
+
+
+def test_render_stream():
+    # names far above the middle reach into the row above, the rows around each row are drawn with it
+    for s in (Settings(file_name='stream'), Settings(grid_height=50, name_offset=-40, name_size=30)):
+        palette = [s, [Color('f00', 'red', 'left'), Color('0f08', 'a long name')], [Color('00f', 'ünï', '', 'x')]]
+        img = Image.open(BytesIO(b''.join(render_stream(palette))))
+        ref = Previewer(palette, show=False)
+        assert img.mode == 'RGBA' and img.text == ref.text
+        assert (np.asarray(img) == np.asarray(ref)).all()
+    assert PNGPreviewer._reach(Settings()) == 0 < PNGPreviewer._reach(s)
+    assert reverse_bytes(b''.join(render_stream(palette))) == Reverser(ref)
+    palette = [Settings(), [Color('f00', 'red & <b>', 'two\nlines'), Color('0000')], [Color('00f8', ']]>')]]
+    data = b''.join(render_stream(palette, 'svg'))
+    assert data == render_bytes(palette, 'svg')
+    assert ElementTree.tostring(Previewer(palette, show=False, output='svg').getroot()) == ElementTree.tostring(
+        ElementTree.fromstring(data)
+    )
+    assert [[(i.hexadecimal, i.name) for i in r] for r in reverse_bytes(data)[1:]] == [
+        [('#ff0000', 'red & <b>'), ('#000000', '')], [('#0000ff', ']]>'), ('#000000', '')]
+    ]
+    # the elements are written as drawsvg writes them
+    for text in ('x < y', 'two\nlines'):
+        draw = Drawing(10, 10)
+        draw.append(Text(text, 12, 1.5, 2, center=True, use='name', fill='#fff', fill_opacity=.5, text_anchor='end'))
+        assert SVGPreviewer._text(text, 12, 1.5, 2, use='name', fill='#fff', fill_opacity=.5, text_anchor='end') in (
+            draw.as_svg()
+        )
+
+
+def test_compact_svg():
+    files = set(listdir())
+    rows = [[Color('f00', 'red & <b>', 'left'), Color('0f08', '', '', 'right')], [Color('f00', 'two\nlines')]]
+    palette = [Settings(file_name='compact', compact=True), *rows]
+    data = render_bytes(palette, 'svg')
+    assert len(data) < len(render_bytes(rows, 'svg')) - len(font_css('Nunito', {}, ''))
+    # a class per fill, whichever tiles use it
+    assert data.count(b'{fill:#ff0000;stroke:#ff0000}') == 1 and b'font-family="' not in data
+    rows = Reverser(data)
+    assert rows[0] == Settings(file_name='compact', compact=True)
+    assert [[(i.hexadecimal, i.name, i.desc_left, i.desc_right) for i in r] for r in rows[1:]] == [
+        [('#ff0000', 'red & <b>', 'left', ''), ('#00ff00', '', '', 'right')],
+        [('#ff0000', 'two\nlines', '', ''), ('#000000', '', '', '')]
+    ]
+    svgz = render_bytes(palette, 'svgz')
+    assert decompress(svgz) == data == decompress(b''.join(render_stream(palette, 'svgz')))
+    assert reverse_bytes(svgz) == rows
+    Previewer(palette, show=False, save=True, output='svgz')
+    assert Reverser('compact.svgz') == rows
+    remove('compact.svgz')
+    assert set(listdir()) == files
+    session = PreviewSession('svg')
+    session.update(palette)
+    palette[1][0] = Color('00f', 'blue')
+    assert ElementTree.tostring(session.update(palette).getroot()) == ElementTree.tostring(
+        Previewer(palette, show=False, output='svg').getroot()
+    )
+
+
+def test_png_profiles():
+    files = set(listdir())
+    rows = [[Color('f00', 'red', 'left'), Color('0f08', 'name')], [Color('00f', 'ünï', '', 'right')]]
+    ref = np.asarray(Previewer(rows, show=False)).astype(int)
+    sizes = {}
+    for profile in ('fast', 'default', 'small'):
+        palette = [Settings(file_name='profile', profile=profile), *rows]
+        for output in ('png', 'webp'):
+            data = render_bytes(palette, output)
+            sizes[profile, output] = len(data)
+            img = Image.open(BytesIO(data))
+            assert img.mode == ('P' if (profile, output) == ('small', 'png') else 'RGBA')
+            # an indexed png may only move the edges of the texts a little, the tiles and their bars are exact
+            error = np.abs(np.asarray(img.convert('RGBA')).astype(int) - ref).max(axis=2)
+            assert error[::168, ::224].max() == error[158::168].max() == 0 and error.max() <= 8
+            assert error.max() == 0 or img.mode == 'P'
+            s, *r = reverse_bytes(data)
+            assert s == palette[0] and [[(i.hexadecimal, i.name) for i in x] for x in r] == [
+                [('#ff0000', 'red'), ('#00ff00', 'name')], [('#0000ff', 'ünï'), ('#000000', '')]
+            ]
+        assert (np.asarray(Image.open(BytesIO(b''.join(render_stream(palette))))) == ref).all()
+    assert sizes['small', 'png'] < sizes['default', 'png'] < sizes['fast', 'png']
+    img = Previewer(palette, show=False, save=True, output='webp', cache=RenderCache(disk_size=0))
+    assert img.mode == 'RGBA' and Reverser('profile.webp') == Reverser(img)
+    remove('profile.webp')
+    assert set(listdir()) == files
+    with raises(ValueError):
+        render_bytes([Settings(profile='smallest'), *rows])
+    # a palette of many colors is only indexed within the bound, if at all
+    values = np.random.default_rng(0).random((64, 3))
+    rows = [ColorArray(values[i:i + 8], name=['name'] * 8, desc_left=['left'] * 8) for i in range(0, 64, 8)]
+    img = Image.open(BytesIO(render_bytes([Settings(profile='small'), *rows])))
+    error = np.abs(np.asarray(img.convert('RGBA')).astype(int) - np.asarray(Previewer(rows, show=False)).astype(int))
+    assert error.max() <= 8
+
+
 def test_yaml():
     c = """
 palette: